@@ -1,35 +1,127 @@
 import os
+import sys
+import queue
+import atexit
+import orjson
 from flask import Flask, request
-from flask_cors import CORS
-from config import Config
+from flask.json.provider import JSONProvider
+from sqlalchemy import text, inspect
+from sqlalchemy.exc import IntegrityError
+from config import Config, ENV, DEFAULT_JWT_SECRET_KEY
 from extensions import db, jwt
-from routes.__init__ import register_routes
+from services.user_cache import get_cached_user
 import logging
+import logging.handlers
 
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Skip thread/process lookups for every record; the format never uses them
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+# Configure logging once, even if this module is imported repeatedly.
+# Request threads only enqueue records; a listener thread formats and writes them.
+_log_listener = None
+
+def _start_log_listener():
+    global _log_listener
+    _log_listener = logging.handlers.QueueListener(_queue_handler.queue, _log_handler)
+    _log_listener.start()
+
+def _restart_log_listener_after_fork():
+    # Threads do not survive fork (gunicorn --preload): give each worker a
+    # fresh queue so the master's backlog is not written twice, and its own listener
+    if _log_listener is not None:
+        _queue_handler.queue = queue.SimpleQueue()
+        _start_log_listener()
+
+def _stop_log_listener():
+    if _log_listener is not None:
+        _log_listener.stop()
+
+if not logging.getLogger().handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%H:%M:%S'
+    ))
+    _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    # Only merge args into the message here; the listener's formatter adds the rest
+    _queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    _start_log_listener()
+    atexit.register(_stop_log_listener)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_log_listener_after_fork)
+    # Per-request tracing is DEBUG; LOG_LEVEL=DEBUG turns it on
+    logging.basicConfig(level=(ENV.log_level or 'INFO').upper(), handlers=[_queue_handler])
 logger = logging.getLogger(__name__)
 
+class OrjsonProvider(JSONProvider):
+    """JSON provider backed by orjson for faster response encoding"""
+
+    @staticmethod
+    def _dumpb(obj):
+        return orjson.dumps(
+            obj,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+            default=str
+        )
+
+    def dumps(self, obj, **kwargs):
+        return self._dumpb(obj).decode()
+
+    def response(self, *args, **kwargs):
+        # jsonify() goes through here: pass orjson's bytes straight to the
+        # response instead of decoding to str and letting Werkzeug re-encode
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumpb(obj), mimetype='application/json')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# Error payloads are constant, so serialize them once at import
+_NOT_FOUND_BODY = orjson.dumps({'error': 'Endpoint not found'})
+_INTERNAL_ERROR_BODY = orjson.dumps({'error': 'Internal server error'})
+_FILE_TOO_LARGE_BODY = orjson.dumps({'error': 'File too large. Maximum size is 16MB'})
+_TOKEN_EXPIRED_BODY = orjson.dumps({'error': 'Token has expired'})
+_INVALID_TOKEN_BODY = orjson.dumps({'error': 'Invalid token'})
+_MISSING_TOKEN_BODY = orjson.dumps({'error': 'Authentication token required'})
+_USER_NOT_FOUND_BODY = orjson.dumps({'error': 'User not found'})
+
+def _debug_auth_header():
+    """Log the Authorization header of the incoming request"""
+    logger.debug("Authorization header: %r", request.headers.get('Authorization'))
+
 def create_app(config_class=Config):
     """Application factory pattern"""
-    app = Flask(__name__)
-    @app.before_request
-    def _debug_auth_header():
-     ah = request.headers.get('Authorization')
-     print(f"[DEBUG] Authorization header: {ah!r}")
+    # Deferred so importing this module stays cheap until an app is built
+    from flask_cors import CORS
+    from routes.__init__ import register_routes
+
+    # API only: no static folder, so no /static/<path> rule to match against
+    app = Flask(__name__, static_folder=None)
+    app.json_provider_class = OrjsonProvider
+    app.json = OrjsonProvider(app)
     app.config.from_object(config_class)
+
+    # Only trace auth headers when debugging
+    if app.debug:
+        app.before_request(_debug_auth_header)
     
-    # Ensure upload folder exists
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Ensure upload folder exists (a single stat when it already does)
+    if not os.path.isdir(app.config['UPLOAD_FOLDER']):
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     # Initialize extensions
     db.init_app(app)
     jwt.init_app(app)
-    CORS(app)
+    # Only the API needs CORS; let browsers cache preflights for a day
+    CORS(
+        app,
+        resources={r"/api/*": {"origins": app.config['CORS_ORIGINS']}},
+        supports_credentials=False,
+        max_age=86400
+    )
     
     # Register routes
     register_routes(app)
@@ -37,70 +129,127 @@ def create_app(config_class=Config):
     # Error handlers
     register_error_handlers(app)
     
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create tables and apply pending schema changes"""
+        init_database(app)
+    
     return app
 
 def register_error_handlers(app):
     """Register error handlers"""
-    from flask import jsonify
+    response_class = app.response_class
+
+    def _error_response(body, status):
+        # Pre-serialized bytes skip jsonify and its current_app lookup
+        return response_class(body, status=status, mimetype='application/json')
     
     @app.errorhandler(404)
     def not_found(error):
-        return jsonify({'error': 'Endpoint not found'}), 404
+        return _error_response(_NOT_FOUND_BODY, 404)
 
     @app.errorhandler(500)
     def internal_error(error):
         db.session.rollback()
-        return jsonify({'error': 'Internal server error'}), 500
+        return _error_response(_INTERNAL_ERROR_BODY, 500)
 
     @app.errorhandler(413)
     def file_too_large(error):
-        return jsonify({'error': 'File too large. Maximum size is 16MB'}), 413
+        return _error_response(_FILE_TOO_LARGE_BODY, 413)
 
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
-        return jsonify({'error': 'Token has expired'}), 401
+        return _error_response(_TOKEN_EXPIRED_BODY, 401)
 
     @jwt.invalid_token_loader
     def invalid_token_callback(error):
-        return jsonify({'error': 'Invalid token'}), 401
+        return _error_response(_INVALID_TOKEN_BODY, 401)
 
     @jwt.unauthorized_loader
     def missing_token_callback(error):
-        return jsonify({'error': 'Authentication token required'}), 401
+        return _error_response(_MISSING_TOKEN_BODY, 401)
+
+    # Protected views read `current_user`: the cached user snapshot for the token's subject
+    @jwt.user_lookup_loader
+    def user_lookup_callback(jwt_header, jwt_data):
+        try:
+            return get_cached_user(int(jwt_data['sub']))
+        except (KeyError, ValueError, TypeError):
+            return None
+
+    @jwt.user_lookup_error_loader
+    def user_lookup_error_callback(jwt_header, jwt_data):
+        return _error_response(_USER_NOT_FOUND_BODY, 404)
 
-def init_database():
-    """Initialize database tables"""
+# Bump whenever the models change so init_database re-runs create_all
+SCHEMA_VERSION = 6
+
+def init_database(app):
+    """Initialize database tables unless this schema version is already applied"""
     try:
         with app.app_context():
-            db.create_all()
-            logger.info("Database tables created successfully")
+            try:
+                _apply_schema()
+            except IntegrityError:
+                # Another process recorded this version between our check and insert
+                logger.info("Database schema version %s applied concurrently", SCHEMA_VERSION)
+            # Drop pooled connections so forked workers open their own
+            db.engine.dispose()
     except Exception as e:
-        logger.error(f"Database initialization failed: {e}")
+        logger.error("Database initialization failed: %s", e)
         raise
 
+def _apply_schema():
+    # One transaction, so a failed create_all never records the version
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (v INTEGER PRIMARY KEY)"))
+        applied = conn.execute(
+            text("SELECT 1 FROM schema_version WHERE v = :v"), {'v': SCHEMA_VERSION}
+        ).scalar()
+        if applied:
+            logger.info("Database schema version %s already applied", SCHEMA_VERSION)
+            return
+        db.metadata.create_all(bind=conn)
+        # create_all skips tables that already exist, so add their newer
+        # (nullable) columns and indexes too
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=conn.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+        conn.execute(text("INSERT INTO schema_version (v) VALUES (:v)"), {'v': SCHEMA_VERSION})
+    logger.info("Database tables created successfully")
+
 if __name__ == '__main__':
     app = create_app()
-    print(f"[BOOT] JWT_SECRET_KEY in app.config = {app.config.get('JWT_SECRET_KEY')!r}")
-
-    
-    # Initialize database
-    init_database()
-    
-    # Check environment variables
-    print("\n=== Environment Check ===")
-    print(f"GOOGLE_API_KEY: {'✓ Set' if os.getenv('GOOGLE_API_KEY') else '✗ Missing'}")
-    print(f"WEATHER_API_KEY: {'✓ Set' if os.getenv('WEATHER_API_KEY') else '✗ Missing'}")
-    print(f"DATABASE_URL: {os.getenv('DATABASE_URL', 'sqlite:///agricultural_ai.db')}")
-    print(f"JWT_SECRET_KEY: {'✓ Set' if os.getenv('JWT_SECRET_KEY') else '✗ Using default'}")
+    init_database(app)
     
     # Start the application
-    port = int(os.getenv('PORT', 5000))
-    debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
+    port = int(ENV.port or 5000)
+    debug_mode = (ENV.flask_debug or 'False').lower() == 'true'
     
-    print(f"\n🚀 Starting Agricultural AI Backend on port {port}")
-    print(f"Debug mode: {debug_mode}")
-    print("\n📚 API Documentation available at: /api/health")
+    # Build the boot report and emit it in a single write
+    lines = [
+        f"[BOOT] JWT_SECRET_KEY in app.config = {app.config.get('JWT_SECRET_KEY')!r}",
+        "",
+        "=== Environment Check ===",
+        f"GOOGLE_API_KEY: {'✓ Set' if app.config.get('GOOGLE_API_KEY') else '✗ Missing'}",
+        f"WEATHER_API_KEY: {'✓ Set' if app.config.get('WEATHER_API_KEY') else '✗ Missing'}",
+        f"DATABASE_URL: {app.config['SQLALCHEMY_DATABASE_URI']}",
+        f"JWT_SECRET_KEY: {'✓ Set' if app.config.get('JWT_SECRET_KEY') != DEFAULT_JWT_SECRET_KEY else '✗ Using default'}",
+        "",
+        f"🚀 Starting Agricultural AI Backend on port {port}",
+        f"Debug mode: {debug_mode}",
+        "",
+        "📚 API Documentation available at: /api/health",
+    ]
+    sys.stdout.write('\n'.join(lines) + '\n')
     
+    # Werkzeug development server; use gunicorn (see gunicorn.conf.py) in production
     app.run(
         host='0.0.0.0',
         port=port,
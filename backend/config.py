@@ -1,17 +1,116 @@
 import os
+import orjson
+from dataclasses import dataclass
+from typing import Optional
 from dotenv import load_dotenv
 from datetime import timedelta
 
 load_dotenv()
 
-class Config:
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")  # Add tis line
-    WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "")
-    SECRET_KEY = os.getenv('SECRET_KEY', 'your-super-secret-key-change-this-in-production')
-    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///agricultural_ai.db')
+@dataclass(frozen=True)
+class EnvSnapshot:
+    """Process-level environment values read once at import time"""
+    port: Optional[str]
+    flask_debug: Optional[str]
+    log_level: Optional[str]
+
+def _load_env():
+    """Read the server boot settings exactly once"""
+    env = os.environ
+    return EnvSnapshot(
+        port=env.get('PORT'),
+        flask_debug=env.get('FLASK_DEBUG'),
+        log_level=env.get('LOG_LEVEL')
+    )
+
+ENV = _load_env()
+
+DEFAULT_JWT_SECRET_KEY = 'supersecretkey12345!change'
+
+def _env(name, default=None):
+    return os.environ.get(name, default)
+
+def _parse_origins(value):
+    """Comma-separated allow-list for the API; any origin when unset"""
+    if not value:
+        return '*'
+    return [origin.strip() for origin in value.split(',') if origin.strip()]
+
+def _json_serializer(obj):
+    return orjson.dumps(obj, default=str).decode()
+
+# Request threads per gunicorn worker (gunicorn.conf.py reads the same variable)
+WEB_THREADS = int(os.environ.get('WEB_THREADS', '8'))
+
+def _engine_options(database_uri):
+    """Connection pool settings (SQLite keeps SQLAlchemy's default pool) and orjson for JSON columns"""
+    options = {
+        'json_serializer': _json_serializer,
+        'json_deserializer': orjson.loads
+    }
+    if database_uri.startswith('sqlite'):
+        return options
+    # One connection per request thread plus a few for the background save/job
+    # executors, so every worker holds at most WEB_THREADS + 4; with
+    # gunicorn -w N the database sees N times that
+    options.update({
+        'pool_size': int(_env('DB_POOL_SIZE', WEB_THREADS)),
+        'max_overflow': int(_env('DB_MAX_OVERFLOW', '4')),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+        'pool_timeout': 10,
+        # Hand out the most recently used connection so idle ones can age out
+        'pool_use_lifo': True
+    })
+    if database_uri.startswith('postgres'):
+        # A runaway query gives its pooled connection back instead of holding it
+        timeout_ms = _env('DB_STATEMENT_TIMEOUT_MS', '5000')
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout_ms}'}
+    return options
+
+class LazyConfigMeta(type):
+    """
+    Resolve environment-backed settings listed in `_LAZY` on first access.
+    Values are cached per class, and `dir()` exposes them so that
+    `app.config.from_object` still picks them up.
+    """
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        cls._resolved = {}
+
+    def __getattr__(cls, name):
+        resolved = cls.__dict__.get('_resolved')
+        if resolved is None or name.startswith('_'):
+            raise AttributeError(name)
+        if name in resolved:
+            return resolved[name]
+        for klass in cls.__mro__:
+            loader = klass.__dict__.get('_LAZY', {}).get(name)
+            if loader is not None:
+                return resolved.setdefault(name, loader(cls))
+        raise AttributeError(f"type object '{cls.__name__}' has no attribute '{name}'")
+
+    def __dir__(cls):
+        names = set(super().__dir__())
+        for klass in cls.__mro__:
+            names.update(klass.__dict__.get('_LAZY', {}))
+        return sorted(names)
+
+class Config(metaclass=LazyConfigMeta):
+    _LAZY = {
+        'OPENAI_API_KEY': lambda cls: _env('OPENAI_API_KEY', ''),
+        'GOOGLE_API_KEY': lambda cls: _env('GOOGLE_API_KEY', ''),
+        'WEATHER_API_KEY': lambda cls: _env('WEATHER_API_KEY', ''),
+        'SECRET_KEY': lambda cls: _env('SECRET_KEY', 'your-super-secret-key-change-this-in-production'),
+        'SQLALCHEMY_DATABASE_URI': lambda cls: _env('DATABASE_URL', 'sqlite:///agricultural_ai.db'),
+        'SQLALCHEMY_ENGINE_OPTIONS': lambda cls: _engine_options(cls.SQLALCHEMY_DATABASE_URI),
+        'JWT_SECRET_KEY': lambda cls: _env('JWT_SECRET_KEY', DEFAULT_JWT_SECRET_KEY),
+        'CORS_ORIGINS': lambda cls: _parse_origins(_env('CORS_ORIGINS')),
+        'BCRYPT_ROUNDS': lambda cls: int(_env('BCRYPT_ROUNDS', 12)),
+        # Only enable behind a proxy that serves X-Sendfile (Apache mod_xsendfile, lighttpd)
+        'USE_X_SENDFILE': lambda cls: _env('USE_X_SENDFILE', 'false').lower() == 'true',
+    }
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'supersecretkey12345!change')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=7)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = 'uploads'
@@ -22,16 +121,22 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
-    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///agricultural_ai_dev.db')
+    _LAZY = {
+        'SQLALCHEMY_DATABASE_URI': lambda cls: _env('DATABASE_URL', 'sqlite:///agricultural_ai_dev.db'),
+    }
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
-    SECRET_KEY = os.getenv('SECRET_KEY')
-    JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
+    _LAZY = {
+        'SECRET_KEY': lambda cls: _env('SECRET_KEY'),
+        'JWT_SECRET_KEY': lambda cls: _env('JWT_SECRET_KEY'),
+    }
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    BCRYPT_ROUNDS = 4  # Minimum cost; keeps test logins fast
     WTF_CSRF_ENABLED = False
\ No newline at end of file
@@ -1,6 +1,44 @@
+import time
+import hashlib
+import threading
+from cachetools import TLRUCache
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 
+# Upper bound on how long decoded claims are reused, whatever the token's exp
+JWT_CLAIMS_CACHE_TTL = 3600
+
+class CachingJWTManager(JWTManager):
+    """
+    JWTManager that reuses the decoded claims of a token it has already verified.
+    Entries are keyed by the token's sha256 and expire no later than its exp claim;
+    blocklist and custom claim checks still run on every request.
+    """
+    def __init__(self, app=None, **kwargs):
+        self._claims_cache = TLRUCache(maxsize=4096, ttu=self._claims_expiry, timer=time.time)
+        self._claims_lock = threading.Lock()
+        super().__init__(app, **kwargs)
+
+    @staticmethod
+    def _claims_expiry(key, claims, now):
+        return min(claims.get('exp', now), now + JWT_CLAIMS_CACHE_TTL)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        # CSRF-bound and expired-allowed decodes are rare; keep them on the uncached path
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = hashlib.sha256(encoded_token.encode('utf-8')).digest()
+        with self._claims_lock:
+            claims = self._claims_cache.get(key)
+        if claims is not None:
+            return claims
+
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        with self._claims_lock:
+            self._claims_cache[key] = claims
+        return claims
+
 # Initialize extensions
 db = SQLAlchemy()
-jwt = JWTManager()
\ No newline at end of file
+jwt = CachingJWTManager()
@@ -0,0 +1,16 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import os
+import multiprocessing
+
+# Each worker's DB pool is sized from WEB_THREADS (see config._engine_options),
+# so keep workers * (threads + 4) under the database's max_connections
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', '8'))
+# Import the app once in the master so workers fork a warm heap
+preload_app = True
+
+def on_starting(server):
+    """Bring the schema up to date once, in the master, before any worker starts"""
+    from app import create_app, init_database
+    init_database(create_app())
@@ -1,12 +1,24 @@
 import streamlit as st
+import asyncio
+import itertools
+import io
+import importlib.util
 import logging
-import tempfile
+import re
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import os
-from services.translation_service import TranslationService
+from services.translation_service import TranslationService, detect_script_language
 from services.location_service import LocationService
 from services.weather_service import WeatherService
-from services.llm_service import AgriculturalLLMService
+from services.llm_service import AgriculturalLLMService, FallbackResponse
 from services.speech_service import SpeechService
+from services.llm_cache import ResponseCache, RESPONSE_TTL, TRANSLATION_TTL, response_key, translation_key
+from services.tts_cache import synthesize
+from services.history_store import HistoryStore
+from services.http_session import create_session
 from config import Config
 import time
 
@@ -24,86 +36,192 @@ except ImportError:
     except ImportError:
         pass
 
+# Conversation history is bounded; the sidebar only previews the first 200 chars
+HISTORY_LIMIT = 50
+HISTORY_RESPONSE_CHARS = 400
+
+# Sentence boundary for incremental translation (Latin and Devanagari full stops)
+_SENTENCE_END = re.compile(r'(?<=[.!?।])\s+')
+
 class EnhancedAgriculturalChatbot:
     def __init__(self):
         self.translation_service = TranslationService()
+        # Shared pooled HTTP session so repeat lookups skip the TCP/TLS handshake
+        self._http = create_session()
         self.location_service = LocationService(Config.WEATHER_API_KEY)
-        self.weather_service = WeatherService(Config.WEATHER_API_KEY)
+        self.weather_service = WeatherService(Config.WEATHER_API_KEY, session=self._http)
         self.speech_service = SpeechService()
+        self.response_cache = ResponseCache()
+        self.history_store = HistoryStore()
         
         # Use Gemini for LLM
         if Config.GOOGLE_API_KEY:
             self.llm_service = AgriculturalLLMService(Config.GOOGLE_API_KEY)
+            # Pay DNS/TLS setup in the background rather than on the first query
+            threading.Thread(target=self.llm_service.warmup, daemon=True).start()
         else:
             st.error("Google API key required for Gemini")
             st.stop()
     
-    def process_query(self, query, location, input_language=None):
+    def get_coordinates(self, location):
+        """Geocoding (cached inside LocationService); returns (None, None) when the location is unknown"""
+        return self.location_service.get_coordinates(location)
+    
+    def get_weather(self, lat, lon):
+        """Weather lookup (cached inside WeatherService); returns None when unavailable"""
+        return self.weather_service.get_weather(lat, lon)
+    
+    def process_query(self, query, location, input_language=None, stream_placeholder=None):
         """Main processing pipeline for any agricultural query"""
-        try:
-            # Step 1: Detect original language if not provided
-            if not input_language:
-                st.write("🔍 Detecting language...")
-                original_language = self.translation_service.detect_language(query)
-            else:
-                original_language = input_language
+        return asyncio.run(self.process_query_async(query, location, input_language, stream_placeholder))
+    
+    async def process_query_async(self, query, location, input_language=None, stream_placeholder=None):
+        """
+        Async pipeline: geocoding starts alongside language detection, and
+        translation overlaps the weather fetch. Blocking service calls run in
+        worker threads; all st.* calls stay on the script thread.
+        If `stream_placeholder` is given, the answer is rendered into it as it
+        is generated.
+        """
+        # One collapsible status element whose label tracks the current stage
+        with st.status("Processing your query...", expanded=False) as status:
+            try:
+                # Geocoding does not depend on the query language, start it right away
+                geo_task = asyncio.create_task(
+                    asyncio.to_thread(self.get_coordinates, location)
+                )
                 
-            language_name = self.translation_service.get_language_name(original_language)
-            st.write(f"Language: {language_name} ({original_language})")
-            
-            # Step 2: Translate query to English if needed
-            if original_language != 'en':
-                st.write("🔄 Translating query to English...")
-                english_query = self.translation_service.translate_to_english(query)
-                st.write(f"English query: {english_query}")
-            else:
-                english_query = query
-                st.write("Query is already in English")
-            
-            # Step 3: Get coordinates from location
-            st.write("📍 Getting location coordinates...")
-            lat, lon = self.location_service.get_coordinates(location)
-            if not lat or not lon:
-                error_msg = "Sorry, I couldn't find the location. Please provide a valid location."
+                # Step 1: Detect original language if not provided
+                if not input_language:
+                    # ASCII and single-language scripts are decided without langdetect
+                    original_language = detect_script_language(query)
+                    if not original_language:
+                        status.update(label="🔍 Detecting language...")
+                        original_language = await asyncio.to_thread(self.translation_service.detect_language, query)
+                else:
+                    original_language = input_language
+                    
+                language_name = self.translation_service.get_language_name(original_language)
+                
+                # Step 2: Translate query to English if needed (runs while we fetch weather)
+                translate_task = None
                 if original_language != 'en':
-                    error_msg = self.translation_service.translate_from_english(error_msg, original_language)
-                return error_msg, original_language
-            st.write(f"Coordinates: {lat:.4f}, {lon:.4f}")
-            
-            # Step 4: Get weather information
-            st.write("🌤️ Fetching weather data...")
-            weather_info = self.weather_service.get_weather(lat, lon)
-            if weather_info:
-                st.write(f"Current weather: {weather_info['description']}, {weather_info['temperature']}°C")
-            
-            # Step 5: Generate LLM response
-            st.write("🤖 Generating agricultural advice...")
-            response = self.llm_service.generate_response(english_query, location, weather_info)
-            
-            # Step 6: Translate response back to original language if needed
-            if original_language != 'en':
-                st.write(f"🔄 Translating response back to {language_name}...")
-                response = self.translation_service.translate_from_english(response, original_language)
-            else:
-                st.write("Response is already in English")
-            
-            return response, original_language
-            
-        except Exception as e:
-            logging.error(f"Error in processing query: {e}")
-            error_msg = f"An error occurred while processing your query: {str(e)}"
-            
-            # Try to translate error message to original language
-            try:
-                if 'original_language' in locals() and original_language != 'en':
-                    error_msg = self.translation_service.translate_from_english(error_msg, original_language)
+                    status.update(label=f"🔄 Translating {language_name} query to English...")
+                    translate_task = asyncio.create_task(
+                        asyncio.to_thread(self.translation_service.translate_to_english, query)
+                    )
+                
+                # Step 3: Get coordinates from location
+                status.update(label="📍 Getting location coordinates...")
+                lat, lon = await geo_task
+                if not lat or not lon:
+                    error_msg = "Sorry, I couldn't find the location. Please provide a valid location."
+                    if original_language != 'en':
+                        error_msg = self.translation_service.translate_from_english(error_msg, original_language)
                     return error_msg, original_language
-            except:
-                pass
                 
-            return error_msg, 'en'
+                # Step 4: Get weather information
+                status.update(label="🌤️ Fetching weather data...")
+                weather_task = asyncio.to_thread(self.get_weather, lat, lon)
+                if translate_task:
+                    english_query, weather_info = await asyncio.gather(translate_task, weather_task)
+                else:
+                    english_query = query
+                    weather_info = await weather_task
+                
+                # Step 5: Generate LLM response (skipped when an identical query was answered recently)
+                cache_key = response_key(english_query, location, lat, lon, weather_info)
+                response = self.response_cache.get(cache_key)
+                translated = None
+                if response is None:
+                    status.update(label="🤖 Generating agricultural advice...")
+                    if stream_placeholder is not None:
+                        response, translated = self._stream_response(
+                            english_query, location, weather_info, original_language, stream_placeholder
+                        )
+                    else:
+                        response = await asyncio.to_thread(
+                            self.llm_service.generate_response, english_query, location, weather_info
+                        )
+                    # Fallback text stands in for one failed call; never serve it again from cache
+                    if not isinstance(response, FallbackResponse):
+                        self.response_cache.set(cache_key, response, expire=RESPONSE_TTL)
+                
+                # Step 6: Translate response back to original language if needed
+                if original_language != 'en':
+                    status.update(label=f"🔄 Translating response back to {language_name}...")
+                    tr_key = translation_key(response, original_language)
+                    if translated is None:
+                        translated = self.response_cache.get(tr_key)
+                    if translated is None:
+                        translated = await asyncio.to_thread(
+                            self.translation_service.translate_from_english, response, original_language
+                        )
+                    # A failed translation comes back as the English source; only cache real ones
+                    if translated and translated != response and not isinstance(response, FallbackResponse):
+                        self.response_cache.set(tr_key, translated, expire=TRANSLATION_TTL)
+                    response = translated
+                
+                weather_note = f" · {weather_info['description']}, {weather_info['temperature']}°C" if weather_info else ""
+                status.update(label=f"✅ {language_name} · {lat:.4f}, {lon:.4f}{weather_note}")
+                return response, original_language
+                
+            except Exception as e:
+                logging.error(f"Error in processing query: {e}")
+                status.update(label="⚠️ Query processing failed")
+                error_msg = f"An error occurred while processing your query: {str(e)}"
+                
+                # Try to translate error message to original language
+                try:
+                    if 'original_language' in locals() and original_language != 'en':
+                        error_msg = self.translation_service.translate_from_english(error_msg, original_language)
+                        return error_msg, original_language
+                except:
+                    pass
+                    
+                return error_msg, 'en'
+    
+    def _stream_response(self, english_query, location, weather_info, target_language, placeholder):
+        """
+        Render the LLM answer into `placeholder` as it streams. Non-English
+        answers are translated sentence by sentence so the first sentence shows
+        up long before the full response is done.
+        Returns (english_response, translated_response_or_None).
+        """
+        chunks = []
+        translated_sentences = []
+        pending = ''
+        untranslated = False
+        
+        def translate(sentence):
+            nonlocal untranslated
+            result = self.translation_service.translate_from_english(sentence, target_language)
+            # translate_from_english hands back the source text when it fails
+            untranslated = untranslated or result == sentence
+            translated_sentences.append(result)
+            placeholder.markdown(' '.join(translated_sentences))
+        
+        for chunk in self.llm_service.generate_response_stream(english_query, location, weather_info):
+            chunks.append(chunk)
+            if target_language == 'en':
+                placeholder.markdown(''.join(chunks))
+                continue
+            
+            pending += chunk
+            sentences = _SENTENCE_END.split(pending)
+            pending = sentences.pop()
+            for sentence in sentences:
+                translate(sentence)
+        
+        if target_language != 'en' and pending.strip():
+            translate(pending.strip())
+        
+        response = self.llm_service.finish_stream(chunks)
+        # A partly untranslated answer is not returned, so the caller translates (and caches) it whole
+        translated = ' '.join(translated_sentences) if target_language != 'en' and not untranslated else None
+        return response, translated
     
-    def process_speech_input(self, location, selected_language='auto'):
+    def process_speech_input(self, location, selected_language='auto', duration=5):
         """Process speech input and return response"""
         try:
             # Convert language code for speech recognition
@@ -111,9 +229,12 @@ class EnhancedAgriculturalChatbot:
                 speech_lang = self.speech_service.get_language_code_for_speech(selected_language)
             else:
                 speech_lang = 'auto'
+            input_language = selected_language if selected_language != 'auto' else None
             
-            # Get speech input
-            speech_text = self.speech_service.speech_to_text(language=speech_lang, duration=5)
+            # Get speech input; recognition of a short phrase overlaps the end-of-phrase wait
+            speech_text = self.speech_service.speech_to_text(
+                language=speech_lang, duration=duration, transcribe_early=True
+            )
             
             if speech_text:
                 st.success(f"🎤 Recognized: {speech_text}")
@@ -121,7 +242,7 @@ class EnhancedAgriculturalChatbot:
                 # Process the recognized text
                 response, response_language = self.process_query(
                     speech_text, location, 
-                    input_language=selected_language if selected_language != 'auto' else None
+                    input_language=input_language
                 )
                 
                 return speech_text, response, response_language
@@ -132,26 +253,176 @@ class EnhancedAgriculturalChatbot:
             logging.error(f"Speech processing error: {e}")
             return None, f"Speech processing failed: {str(e)}", 'en'
 
-def create_audio_player_with_controls(audio_file_path):
-    """Create an audio player with stop controls"""
-    if audio_file_path and os.path.exists(audio_file_path):
-        # Read the audio file and encode it
-        with open(audio_file_path, "rb") as f:
-            audio_bytes = f.read()
+@st.cache_resource
+def _probe_imports():
+    """
+    Check optional audio packages once per process. find_spec locates a
+    package without importing it, so no audio devices are initialised.
+    """
+    modules = {
+        "SpeechRecognition": "speech_recognition",
+        "PyAudio": "pyaudio",
+        "Pygame": "pygame",
+        "gTTS": "gtts",
+    }
+    return {name: importlib.util.find_spec(module) is not None for name, module in modules.items()}
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _list_microphones():
+    """Microphone enumeration probes PortAudio; refresh at most once a minute"""
+    import speech_recognition as sr
+    return sr.Microphone.list_microphone_names()
+
+@st.cache_resource
+def get_chatbot():
+    """One chatbot (and its services) shared by every browser session"""
+    return EnhancedAgriculturalChatbot()
+
+_HISTORY_OWNER_RE = re.compile(r'[0-9a-f]{32}')
+
+def _history_owner():
+    """
+    Id this browser's history is stored under. It is kept in the page URL
+    (?sid=...) so a reload resumes the same history and no other.
+    """
+    if 'history_owner' not in st.session_state:
+        owner = st.experimental_get_query_params().get('sid', [''])[0]
+        if not _HISTORY_OWNER_RE.fullmatch(owner):
+            owner = uuid.uuid4().hex
+            st.experimental_set_query_params(sid=owner)
+        st.session_state.history_owner = owner
+    return st.session_state.history_owner
+
+def _remember(chatbot, entry):
+    """Add an exchange to this session's history and queue it for persistence"""
+    st.session_state.conversation_history.append(entry)
+    chatbot.history_store.record(_history_owner(), entry)
+
+def synthesize_audio_response(response, response_lang, speech_service, audio_speed):
+    """Spoken answer as mp3 bytes (from the TTS cache when possible), or None on failure"""
+    with st.spinner("🎵 Generating audio..."):
+        tts_lang = speech_service.get_tts_language_code(response_lang)
+        try:
+            return synthesize(response, tts_lang, audio_speed == 'slow')
+        except Exception as e:
+            st.error(f"Audio generation failed: {e}")
+            st.info("Try using text-to-speech offline mode or check your internet connection")
+            return None
+
+def render_answer(answer):
+    """
+    Show an answer and its audio. The last answer lives in session_state and
+    is drawn again on every rerun (downloads, setting changes), so it stays
+    on screen; the player's own controls handle replay.
+    """
+    if answer.get('speech_text'):
+        st.markdown(f"**🎤 You said:** {answer['speech_text']}")
+    st.markdown("### 📋 Agricultural Advice:")
+    st.markdown(answer['response'])
+    
+    audio_bytes = answer.get('audio')
+    if audio_bytes:
+        st.markdown("### 🔊 Audio Response:")
+        st.audio(audio_bytes, format='audio/mp3')
+        st.download_button(
+            label="💾 Download Audio",
+            data=audio_bytes,
+            file_name=f"response_{answer['timestamp']}.mp3",
+            mime="audio/mp3"
+        )
+
+# ---------- Diagnostics ----------
+# Each check returns (kind, payload) messages instead of drawing, so it can run
+# in a worker thread; _render_diagnostic draws them on the script thread.
+def _render_diagnostic(messages):
+    """Draw the messages produced by a _diagnose_* check"""
+    for kind, payload in messages:
+        if kind == 'audio':
+            st.audio(payload, format='audio/mp3')
+        else:
+            getattr(st, kind)(payload)
+
+def _diagnose_speech_recognition():
+    messages = [('info', "Testing speech recognition capabilities...")]
+    try:
+        import speech_recognition as sr
+        import pyaudio
         
-        # Create audio player with controls
-        st.audio(audio_bytes, format='audio/mp3', start_time=0)
+        r = sr.Recognizer()
         
-        # Add stop button
-        col1, col2, col3 = st.columns([1, 1, 2])
-        with col1:
-            if st.button("⏹️ Stop Audio"):
-                st.success("Audio stopped!")
-                st.experimental_rerun()
+        # Test microphone list
+        try:
+            mics = sr.Microphone.list_microphone_names()
+            messages.append(('write', f"Available microphones: {len(mics)}"))
+            for i, mic in enumerate(mics[:3]):  # Show first 3
+                messages.append(('write', f"  {i}: {mic}"))
+        except Exception as e:
+            messages.append(('error', f"Microphone enumeration failed: {e}"))
         
-        with col2:
-            if st.button("🔄 Replay"):
-                st.experimental_rerun()
+        # Test microphone access
+        try:
+            with sr.Microphone() as source:
+                r.adjust_for_ambient_noise(source, duration=1)
+            messages.append(('success', "✅ Microphone access: Available"))
+            messages.append(('success', "✅ Speech recognition: Ready"))
+        except Exception as e:
+            messages.append(('error', f"❌ Microphone test failed: {e}"))
+            messages.append(('error', "Possible fixes:\n- Check microphone permissions\n- Restart browser\n- Try different microphone"))
+            
+    except ImportError as e:
+        messages.append(('error', f"❌ Required packages missing: {e}"))
+        messages.append(('error', "Install with: pip install SpeechRecognition pyaudio"))
+    return messages
+
+def _diagnose_text_to_speech():
+    test_text = "This is a test of the text-to-speech system."
+    messages = [('info', "Testing text-to-speech...")]
+    try:
+        from gtts import gTTS
+        
+        tts = gTTS(text=test_text, lang='en', slow=False)
+        buffer = io.BytesIO()
+        tts.write_to_fp(buffer)
+        
+        messages.append(('audio', buffer.getvalue()))
+        messages.append(('success', "✅ Text-to-speech: Working"))
+            
+    except Exception as e:
+        messages.append(('error', f"❌ Text-to-speech test failed: {e}"))
+    return messages
+
+def _diagnose_translation(chatbot):
+    test_texts = {
+        "English": "How to grow rice?",
+        "Hindi": "धान कैसे उगाएं?",
+        "Marathi": "भात कसे पिकवावे?"
+    }
+    
+    try:
+        texts = list(test_texts.values())
+        results = chatbot.translation_service.batch_translate_to_english(texts)
+        return [
+            ('write', f"**{lang}**: {text} → Detected: {detected} → English: {translated}")
+            for lang, text, (detected, translated) in zip(test_texts, texts, results)
+        ]
+    except Exception as e:
+        return [('error', f"Translation test failed: {e}")]
+
+def _diagnose_ai_response(chatbot):
+    test_query = "What is the best season for planting wheat?"
+    test_location = "Punjab, India"
+    test_weather = {"temperature": 20, "description": "Clear sky", "humidity": 60}
+    
+    try:
+        response = chatbot.llm_service.generate_response(
+            test_query, test_location, test_weather
+        )
+        return [
+            ('success', "✅ AI Response: Working"),
+            ('write', f"Sample response: {response[:200]}...")
+        ]
+    except Exception as e:
+        return [('error', f"❌ AI Response test failed: {e}")]
 
 def main():
     st.set_page_config(
@@ -175,22 +446,22 @@ def main():
     
     st.success("✅ Using Google Gemini AI with Speech Support")
     
-    # Initialize session state for audio control
-    if 'audio_playing' not in st.session_state:
-        st.session_state.audio_playing = False
-    if 'current_audio_file' not in st.session_state:
-        st.session_state.current_audio_file = None
+    # Last answer shown, kept across reruns
+    if 'last_answer' not in st.session_state:
+        st.session_state.last_answer = None
     
     # Initialize chatbot
-    if 'chatbot' not in st.session_state:
-        try:
-            st.session_state.chatbot = EnhancedAgriculturalChatbot()
-        except Exception as e:
-            st.error(f"Failed to initialize chatbot: {e}")
-            st.stop()
+    try:
+        chatbot = get_chatbot()
+    except Exception as e:
+        st.error(f"Failed to initialize chatbot: {e}")
+        st.stop()
     
     if 'conversation_history' not in st.session_state:
-        st.session_state.conversation_history = []
+        # Resume this browser's persisted history (after a reload)
+        st.session_state.conversation_history = deque(
+            chatbot.history_store.recent(_history_owner(), HISTORY_LIMIT), maxlen=HISTORY_LIMIT
+        )
     
     # Sidebar for language selection
     with st.sidebar:
@@ -229,16 +500,15 @@ def main():
         
         # System status in sidebar
         st.markdown("### 📊 Quick Status")
-        try:
-            import speech_recognition as sr
+        available = _probe_imports()
+        if available["SpeechRecognition"]:
             st.success("🎤 Speech Recognition: Ready")
-        except ImportError:
+        else:
             st.error("🎤 Speech Recognition: Not Available")
         
-        try:
-            import pygame
+        if available["Pygame"]:
             st.success("🔊 Audio Playback: Ready")
-        except ImportError:
+        else:
             st.error("🔊 Audio Playback: Not Available")
     
     # Main interface
@@ -271,142 +541,88 @@ def main():
             if st.button("🚀 Get Advice", type="primary", use_container_width=True):
                 if query and location:
                     with st.spinner("🔄 Processing your query..."):
-                        response, response_lang = st.session_state.chatbot.process_query(
+                        advice_placeholder = st.empty()
+                        response, response_lang = chatbot.process_query(
                             query, location, 
-                            input_language=preferred_language if preferred_language != 'auto' else None
+                            input_language=preferred_language if preferred_language != 'auto' else None,
+                            stream_placeholder=advice_placeholder
                         )
+                        advice_placeholder.empty()
                         
                         # Display response
                         st.success("✅ Response Generated!")
-                        st.markdown("### 📋 Agricultural Advice:")
-                        st.markdown(response)
-                        
-                        # Audio response with controls
-                        if enable_audio_response:
-                            st.markdown("### 🔊 Audio Response:")
-                            with st.spinner("🎵 Generating audio..."):
-                                tts_lang = st.session_state.chatbot.speech_service.get_tts_language_code(response_lang)
-                                is_slow = (audio_speed == 'slow')
-                                
-                                try:
-                                    # Generate audio but don't auto-play
-                                    from gtts import gTTS
-                                    import tempfile
-                                    
-                                    tts = gTTS(text=response, lang=tts_lang, slow=is_slow)
-                                    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-                                    tts.save(temp_file.name)
-                                    temp_file.close()
-                                    
-                                    # Store audio file path
-                                    st.session_state.current_audio_file = temp_file.name
-                                    
-                                    # Create audio player with controls
-                                    with open(temp_file.name, "rb") as f:
-                                        audio_bytes = f.read()
-                                    
-                                    st.audio(audio_bytes, format='audio/mp3')
-                                    
-                                    # Audio control buttons
-                                    col_a, col_b = st.columns(2)
-                                    with col_a:
-                                        if st.button("🔄 Replay Audio"):
-                                            st.experimental_rerun()
-                                    with col_b:
-                                        if st.button("💾 Download Audio"):
-                                            st.download_button(
-                                                label="Download MP3",
-                                                data=audio_bytes,
-                                                file_name=f"response_{int(time.time())}.mp3",
-                                                mime="audio/mp3"
-                                            )
-                                    
-                                except Exception as e:
-                                    st.error(f"Audio generation failed: {e}")
-                                    st.info("Try using text-to-speech offline mode or check your internet connection")
+                        st.session_state.last_answer = {
+                            'response': response,
+                            'timestamp': int(time.time()),
+                            'audio': synthesize_audio_response(
+                                response, response_lang, chatbot.speech_service, audio_speed
+                            ) if enable_audio_response else None
+                        }
+                        render_answer(st.session_state.last_answer)
                         
                         # Save to conversation history
-                        st.session_state.conversation_history.append({
+                        _remember(chatbot, {
                             'query': query,
-                            'response': response,
+                            'response': response[:HISTORY_RESPONSE_CHARS],
                             'location': location,
                             'language': response_lang,
                             'timestamp': time.time()
                         })
                 else:
                     st.error("❌ Please provide both query and location.")
+            elif st.session_state.last_answer:
+                render_answer(st.session_state.last_answer)
         
         else:  # Voice Input
             st.markdown("### 🎤 Voice Input")
             st.info(f"Click the button below and speak your question clearly for {recording_duration} seconds!")
             
             # Add speech recognition diagnostics
-            try:
-                import speech_recognition as sr
-                import pyaudio
-                
-                # Test microphone availability
-                try:
-                    # List available microphones
-                    mic_list = sr.Microphone.list_microphone_names()
-                    if mic_list:
-                        st.info(f"🎤 Found {len(mic_list)} microphone(s). Using default microphone.")
-                    else:
-                        st.warning("⚠️ No microphones detected. Please check your audio devices.")
-                except Exception as e:
-                    st.warning(f"Microphone check failed: {e}")
-                
-            except ImportError as e:
-                st.error(f"❌ Required packages missing: {e}")
+            available = _probe_imports()
+            missing = [name for name in ("SpeechRecognition", "PyAudio") if not available[name]]
+            if missing:
+                st.error(f"❌ Required packages missing: {', '.join(missing)}")
                 st.error("Please install: pip install SpeechRecognition pyaudio")
                 st.stop()
             
+            # Test microphone availability
+            try:
+                # List available microphones
+                mic_list = _list_microphones()
+                if mic_list:
+                    st.info(f"🎤 Found {len(mic_list)} microphone(s). Using default microphone.")
+                else:
+                    st.warning("⚠️ No microphones detected. Please check your audio devices.")
+            except Exception as e:
+                st.warning(f"Microphone check failed: {e}")
+            
             if st.button("🎙️ Start Voice Recording", type="primary", use_container_width=True):
                 if location:
                     try:
-                        with st.spinner(f"🎤 Listening for {recording_duration} seconds... Please speak your question now!"):
-                            speech_text, response, response_lang = st.session_state.chatbot.process_speech_input(
+                        with st.spinner(f"🎤 Listening for up to {recording_duration} seconds... Please speak your question now!"):
+                            speech_text, response, response_lang = chatbot.process_speech_input(
                                 location, 
-                                selected_language=preferred_language
+                                selected_language=preferred_language,
+                                duration=recording_duration
                             )
                             
                             if speech_text:
-                                # Display recognized speech
+                                # Display recognized speech and the response
                                 st.success("✅ Speech Recognition Complete!")
-                                st.markdown(f"**🎤 You said:** {speech_text}")
-                                
-                                # Display response
-                                st.markdown("### 📋 Agricultural Advice:")
-                                st.markdown(response)
-                                
-                                # Audio response with controls
-                                if enable_audio_response and response_lang:
-                                    st.markdown("### 🔊 Audio Response:")
-                                    with st.spinner("🎵 Generating audio..."):
-                                        tts_lang = st.session_state.chatbot.speech_service.get_tts_language_code(response_lang)
-                                        is_slow = (audio_speed == 'slow')
-                                        
-                                        try:
-                                            from gtts import gTTS
-                                            import tempfile
-                                            
-                                            tts = gTTS(text=response, lang=tts_lang, slow=is_slow)
-                                            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-                                            tts.save(temp_file.name)
-                                            temp_file.close()
-                                            
-                                            with open(temp_file.name, "rb") as f:
-                                                audio_bytes = f.read()
-                                            
-                                            st.audio(audio_bytes, format='audio/mp3')
-                                            
-                                        except Exception as e:
-                                            st.error(f"Audio generation failed: {e}")
+                                st.session_state.last_answer = {
+                                    'speech_text': speech_text,
+                                    'response': response,
+                                    'timestamp': int(time.time()),
+                                    'audio': synthesize_audio_response(
+                                        response, response_lang, chatbot.speech_service, audio_speed
+                                    ) if enable_audio_response and response_lang else None
+                                }
+                                render_answer(st.session_state.last_answer)
                                 
                                 # Save to conversation history
-                                st.session_state.conversation_history.append({
+                                _remember(chatbot, {
                                     'query': speech_text,
-                                    'response': response,
+                                    'response': response[:HISTORY_RESPONSE_CHARS],
                                     'location': location,
                                     'language': response_lang,
                                     'timestamp': time.time(),
@@ -421,13 +637,15 @@ def main():
                         st.info("Troubleshooting:\n1. Check microphone permissions\n2. Ensure microphone is working\n3. Try refreshing the page\n4. Check internet connection")
                 else:
                     st.error("❌ Please enter your location first.")
+            elif st.session_state.last_answer:
+                render_answer(st.session_state.last_answer)
     
     with col2:
         st.markdown("### 📚 Recent Conversations")
         
         if st.session_state.conversation_history:
             # Display last 3 conversations
-            for i, conv in enumerate(reversed(st.session_state.conversation_history[-3:])):
+            for i, conv in enumerate(itertools.islice(reversed(st.session_state.conversation_history), 3)):
                 with st.expander(f"💬 Query {len(st.session_state.conversation_history) - i}"):
                     st.markdown(f"**Q:** {conv['query']}")
                     st.markdown(f"**Location:** {conv['location']}")
@@ -440,133 +658,42 @@ def main():
         
         # Clear history button
         if st.button("🗑️ Clear History"):
-            st.session_state.conversation_history = []
+            st.session_state.conversation_history.clear()
+            chatbot.history_store.clear(_history_owner())
             st.success("History cleared!")
     
     # Testing and diagnostics section
     with st.expander("🧪 System Diagnostics & Testing"):
         st.markdown("### Test System Components")
         
-        # Enhanced speech recognition test
-        if st.button("Test Speech Recognition"):
-            st.info("Testing speech recognition capabilities...")
-            try:
-                import speech_recognition as sr
-                import pyaudio
-                
-                r = sr.Recognizer()
-                
-                # Test microphone list
-                try:
-                    mics = sr.Microphone.list_microphone_names()
-                    st.write(f"Available microphones: {len(mics)}")
-                    for i, mic in enumerate(mics[:3]):  # Show first 3
-                        st.write(f"  {i}: {mic}")
-                except Exception as e:
-                    st.error(f"Microphone enumeration failed: {e}")
-                
-                # Test microphone access
-                try:
-                    with sr.Microphone() as source:
-                        r.adjust_for_ambient_noise(source, duration=1)
-                    st.success("✅ Microphone access: Available")
-                    st.success("✅ Speech recognition: Ready")
-                except Exception as e:
-                    st.error(f"❌ Microphone test failed: {e}")
-                    st.error("Possible fixes:\n- Check microphone permissions\n- Restart browser\n- Try different microphone")
-                    
-            except ImportError as e:
-                st.error(f"❌ Required packages missing: {e}")
-                st.error("Install with: pip install SpeechRecognition pyaudio")
-        
-        # Test text-to-speech
-        if st.button("Test Text-to-Speech"):
-            test_text = "This is a test of the text-to-speech system."
-            st.info("Testing text-to-speech...")
-            try:
-                from gtts import gTTS
-                import tempfile
-                
-                tts = gTTS(text=test_text, lang='en', slow=False)
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-                tts.save(temp_file.name)
-                temp_file.close()
-                
-                with open(temp_file.name, "rb") as f:
-                    audio_bytes = f.read()
-                
-                st.audio(audio_bytes, format='audio/mp3')
-                st.success("✅ Text-to-speech: Working")
-                
-                # Clean up
-                try:
-                    os.unlink(temp_file.name)
-                except:
-                    pass
-                    
-            except Exception as e:
-                st.error(f"❌ Text-to-speech test failed: {e}")
+        diagnostics = {
+            "Test Speech Recognition": _diagnose_speech_recognition,
+            "Test Text-to-Speech": _diagnose_text_to_speech,
+            "Test Translation": lambda: _diagnose_translation(chatbot),
+            "Test AI Response": lambda: _diagnose_ai_response(chatbot),
+        }
         
-        # Test translation
-        if st.button("Test Translation"):
-            test_texts = {
-                "English": "How to grow rice?",
-                "Hindi": "धान कैसे उगाएं?",
-                "Marathi": "भात कसे पिकवावे?"
-            }
-            
-            for lang, text in test_texts.items():
-                try:
-                    detected = st.session_state.chatbot.translation_service.detect_language(text)
-                    translated = st.session_state.chatbot.translation_service.translate_to_english(text)
-                    st.write(f"**{lang}**: {text} → Detected: {detected} → English: {translated}")
-                except Exception as e:
-                    st.error(f"Translation test failed for {lang}: {e}")
+        if st.button("▶️ Run All Diagnostics", type="primary"):
+            # The checks are independent network/device probes; run them side by side
+            with st.spinner("Running all diagnostics..."):
+                with ThreadPoolExecutor(max_workers=len(diagnostics)) as executor:
+                    futures = {name: executor.submit(check) for name, check in diagnostics.items()}
+                    results = {name: future.result() for name, future in futures.items()}
+            for name, messages in results.items():
+                st.markdown(f"**{name.replace('Test ', '')}**")
+                _render_diagnostic(messages)
         
-        # Test LLM
-        if st.button("Test AI Response"):
-            test_query = "What is the best season for planting wheat?"
-            test_location = "Punjab, India"
-            test_weather = {"temperature": 20, "description": "Clear sky", "humidity": 60}
-            
-            try:
-                response = st.session_state.chatbot.llm_service.generate_response(
-                    test_query, test_location, test_weather
-                )
-                st.success("✅ AI Response: Working")
-                st.write(f"Sample response: {response[:200]}...")
-            except Exception as e:
-                st.error(f"❌ AI Response test failed: {e}")
+        for name, check in diagnostics.items():
+            if st.button(name):
+                _render_diagnostic(check())
         
         # Enhanced system status
         st.markdown("### 📊 Detailed System Status")
         
-        status_data = {}
-        
-        # Check each component
-        try:
-            import speech_recognition as sr
-            status_data["SpeechRecognition"] = "✅ Installed"
-        except ImportError:
-            status_data["SpeechRecognition"] = "❌ Missing"
-        
-        try:
-            import pyaudio
-            status_data["PyAudio"] = "✅ Installed"
-        except ImportError:
-            status_data["PyAudio"] = "❌ Missing"
-        
-        try:
-            import pygame
-            status_data["Pygame"] = "✅ Installed"
-        except ImportError:
-            status_data["Pygame"] = "❌ Missing"
-        
-        try:
-            from gtts import gTTS
-            status_data["gTTS"] = "✅ Installed"
-        except ImportError:
-            status_data["gTTS"] = "❌ Missing"
+        status_data = {
+            component: "✅ Installed" if installed else "❌ Missing"
+            for component, installed in _probe_imports().items()
+        }
         
         for component, status in status_data.items():
             st.write(f"**{component}**: {status}")
@@ -1,6 +1,29 @@
 from datetime import datetime
+import hashlib
+from functools import lru_cache
+from secrets import token_bytes
+import bcrypt
+from flask import current_app
+from sqlalchemy import select, func
+from sqlalchemy.orm import column_property
 from extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+
+def _bcrypt_secret(password):
+    # bcrypt only uses the first 72 bytes; newer releases reject longer input
+    return password.encode('utf-8')[:72]
+
+@lru_cache(maxsize=None)
+def _dummy_hash(rounds):
+    return bcrypt.hashpw(token_bytes(16), bcrypt.gensalt(rounds=rounds))
+
+def dummy_password_check(password):
+    """Spend the same bcrypt work as a real check, for logins with an unknown login_id"""
+    rounds = current_app.config.get('BCRYPT_ROUNDS', 12)
+    bcrypt.checkpw(_bcrypt_secret(password), _dummy_hash(rounds))
+
+# to_dict() methods return datetimes as-is: the app's orjson JSON provider
+# writes them in ISO 8601 (same text as isoformat()) while encoding the response.
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -16,15 +39,26 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
+    # Bumped on every profile/login change so cached snapshots in other workers go stale
+    profile_version = db.Column(db.Integer, nullable=True, default=0)
     
     # Relationships
     chat_sessions = db.relationship('ChatSession', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        rounds = current_app.config.get('BCRYPT_ROUNDS', 12)
+        self.password_hash = bcrypt.hashpw(_bcrypt_secret(password), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if self.password_hash.startswith('$2'):
+            return bcrypt.checkpw(_bcrypt_secret(password), self.password_hash.encode('utf-8'))
+        
+        # Legacy werkzeug pbkdf2 hash: upgrade to bcrypt on a successful login
+        # (the caller's commit persists it)
+        if check_password_hash(self.password_hash, password):
+            self.set_password(password)
+            return True
+        return False
     
     def to_dict(self):
         return {
@@ -35,13 +69,20 @@ class User(db.Model):
             'phone_number': self.phone_number,
             'preferred_language': self.preferred_language,
             'location': self.location,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'last_login': self.last_login.isoformat() if self.last_login else None,
+            'created_at': self.created_at,
+            'last_login': self.last_login,
             'is_active': self.is_active
         }
+    
+    def bump_profile_version(self):
+        self.profile_version = (self.profile_version or 0) + 1
 
 class ChatSession(db.Model):
     __tablename__ = 'chat_sessions'
+    # Per-user lookups and the newest-first session list (session_id is unique, so already indexed)
+    __table_args__ = (
+        db.Index('ix_chatsession_user_updated', 'user_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -50,21 +91,44 @@ class ChatSession(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationships
-    messages = db.relationship('ChatMessage', backref='session', lazy=True, cascade='all, delete-orphan')
+    # Relationships (dynamic: a query, so counting or paging never loads every row)
+    messages = db.relationship('ChatMessage', backref='session', lazy='dynamic', cascade='all, delete-orphan')
     
-    def to_dict(self):
+    def to_summary_dict(self):
+        """Listing payload; no message count, so no per-session aggregate"""
         return {
             'id': self.id,
             'session_id': self.session_id,
             'title': self.title,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'message_count': len(self.messages)
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
+    
+    def to_full_dict(self):
+        """Detail payload, including the message count"""
+        data = self.to_summary_dict()
+        data['message_count'] = self.message_count
+        return data
+    
+    to_dict = to_full_dict
+    
+    @classmethod
+    def get_for_user(cls, session_pk, user_id, options=()):
+        """Session by primary key if `user_id` owns it; served from the identity map when already loaded"""
+        try:
+            session = db.session.get(cls, int(session_pk), options=options)
+        except (TypeError, ValueError):
+            return None
+        if session is None or session.user_id != int(user_id):
+            return None
+        return session
 
 class ChatMessage(db.Model):
     __tablename__ = 'chat_messages'
+    # Messages of a session in order, and the message_count subquery
+    __table_args__ = (
+        db.Index('ix_chatmessage_session_ts', 'session_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('chat_sessions.id'), nullable=False)
@@ -87,18 +151,32 @@ class ChatMessage(db.Model):
             'audio_file_path': self.audio_file_path,
             'location': self.location,
             'weather_data': self.weather_data,
-            'timestamp': self.timestamp.isoformat()
+            'timestamp': self.timestamp
         }
 
+# Counted in SQL; deferred so it is only computed when read or undeferred
+ChatSession.message_count = column_property(
+    select(func.count(ChatMessage.id))
+    .where(ChatMessage.session_id == ChatSession.id)
+    .correlate_except(ChatMessage)
+    .scalar_subquery(),
+    deferred=True
+)
+
 class AudioFile(db.Model):
     __tablename__ = 'audio_files'
+    # Reuse of synthesized speech by content (see tts_content_hash)
+    __table_args__ = (
+        db.Index('ix_audiofile_hash_type', 'content_hash', 'file_type'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
-    file_path = db.Column(db.String(500), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False, index=True)
     file_type = db.Column(db.String(20), nullable=False)  # 'input' or 'output'
     file_size = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(32), nullable=True)  # TTS output only
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -108,5 +186,30 @@ class AudioFile(db.Model):
             'original_filename': self.original_filename,
             'file_type': self.file_type,
             'file_size': self.file_size,
-            'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+            'created_at': self.created_at
+        }
+
+def tts_content_hash(text, language):
+    """Key for synthesized speech of `text` in `language`"""
+    return hashlib.blake2b(f"{language}\0{text}".encode('utf-8'), digest_size=16).hexdigest()
+
+class VoiceJob(db.Model):
+    __tablename__ = 'voice_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'done' or 'failed'
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
@@ -1,6 +1,19 @@
+import numpy as np
 import pandas as pd
-import json
-import random
+import orjson
+import os
+import importlib.util
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CROP_CSV_PATH = os.path.join(BASE_DIR, "..", "data", "crop_production.csv")
+OUTPUT_FILE = os.path.join(BASE_DIR, "farmer_qa_dataset.jsonl")
+
+# Only the columns the production questions use. Production stays float64 so
+# the quoted tonnages keep their exact text.
+CROP_COLUMNS = ["State_Name", "Crop", "Production"]
+CROP_DTYPES = {"State_Name": "string", "Crop": "string", "Production": "float64"}
+# Multi-threaded CSV parsing when pyarrow is installed
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
 
 # -----------------------------
 # Hardcoded Soil Dataset (>10 states)
@@ -21,11 +34,6 @@ soil_data = [
 ]
 soil_df = pd.DataFrame(soil_data)
 
-# -----------------------------
-# Load Crop Production Dataset
-# -----------------------------
-crop_df = pd.read_csv("../data/crop_production.csv")
-
 # -----------------------------
 # Static Knowledge Sources
 # -----------------------------
@@ -77,131 +85,175 @@ market_prices = {
 # -----------------------------
 # Helper Functions to Generate Q&A
 # -----------------------------
-def generate_soil_questions(row):
-    state = row["State"]
-    soil_type = row["Soil_Type"]
-    crops = row["Major_Crops"].split(",") if isinstance(row["Major_Crops"], str) else []
-
-    questions = []
-    if crops:
-        q1 = f"What crops are suitable for {soil_type.lower()} in {state}?"
-        a1 = f"In {state}, {soil_type.lower()} is best suited for growing {', '.join(crops)}."
-        questions.append({"input": q1, "output": a1})
-
-        q2 = f"I am a farmer in {state}. Which crops should I grow in {soil_type.lower()} soil?"
-        a2 = f"You can grow {', '.join(crops)} in {soil_type.lower()} soil in {state}."
-        questions.append({"input": q2, "output": a2})
-
-    return questions
-
-
-def generate_production_questions(row):
-    state = row["State_Name"]
-    crop = row["Crop"]
-    production = row.get("Production", None)
-
-    questions = []
-    if pd.notna(production) and production > 0:
-        q1 = f"Which state produces the most {crop.lower()} in India?"
-        a1 = f"{state} produces one of the highest amounts of {crop.lower()} in India with {production} tonnes."
-        questions.append({"input": q1, "output": a1})
-
-        q2 = f"How much {crop.lower()} is produced in {state}?"
-        a2 = f"In {state}, the production of {crop.lower()} is about {production} tonnes."
-        questions.append({"input": q2, "output": a2})
-
-    return questions
+def _qa_records(*pairs):
+    """Stack (question Series, answer Series) pairs into input/output records"""
+    frames = [pd.DataFrame({"input": q, "output": a}) for q, a in pairs]
+    return pd.concat(frames, ignore_index=True).to_dict("records")
+
+
+def generate_soil_questions(df):
+    df = df[df["Major_Crops"].apply(lambda v: isinstance(v, str))]
+    if df.empty:
+        return []
+    state = df["State"]
+    soil_type = df["Soil_Type"].str.lower()
+    # Same text as ', '.join(crops.split(','))
+    crops = df["Major_Crops"].str.replace(",", ", ", regex=False)
+
+    return _qa_records(
+        ("What crops are suitable for " + soil_type + " in " + state + "?",
+         "In " + state + ", " + soil_type + " is best suited for growing " + crops + "."),
+        ("I am a farmer in " + state + ". Which crops should I grow in " + soil_type + " soil?",
+         "You can grow " + crops + " in " + soil_type + " soil in " + state + "."),
+    )
+
+
+def generate_production_questions(df):
+    if "Production" not in df:
+        return []
+    df = df[df["Production"].notna() & (df["Production"] > 0) & df["Crop"].notna()]
+    if df.empty:
+        return []
+    state = df["State_Name"].astype(str)
+    crop = df["Crop"].astype(str).str.lower()
+    production = df["Production"].astype(str)
+
+    return _qa_records(
+        ("Which state produces the most " + crop + " in India?",
+         state + " produces one of the highest amounts of " + crop + " in India with " + production + " tonnes."),
+        ("How much " + crop + " is produced in " + state + "?",
+         "In " + state + ", the production of " + crop + " is about " + production + " tonnes."),
+    )
+
+
+WEATHER_TEMPLATES = (
+    "What should farmers do during {condition} weather?",
+    "As a farmer, how does {condition} weather affect crops?",
+)
+PEST_TEMPLATES = (
+    "How can farmers control {pest} in {crop}?",
+    "What is the best way to manage {pest} when growing {crop}?",
+)
+FERTILIZER_TEMPLATES = (
+    "What is the recommended fertilizer schedule for {crop}?",
+    "How much fertilizer should I apply for {crop} cultivation?",
+)
+SUBSIDY_TEMPLATES = (
+    "What is the {scheme} scheme for farmers?",
+    "Can farmers get benefits from {scheme}?",
+)
+MARKET_TEMPLATES = (
+    "What is the current MSP of {crop}?",
+    "How much does {crop} sell for in the market?",
+)
 
 
 def generate_weather_questions():
-    questions = []
-    for condition, advice in weather_advice.items():
-        q1 = f"What should farmers do during {condition} weather?"
-        a1 = advice
-        questions.append({"input": q1, "output": a1})
-
-        q2 = f"As a farmer, how does {condition} weather affect crops?"
-        a2 = advice
-        questions.append({"input": q2, "output": a2})
-    return questions
+    return [
+        {"input": template.format(condition=condition), "output": advice}
+        for condition, advice in weather_advice.items()
+        for template in WEATHER_TEMPLATES
+    ]
 
 
 def generate_pest_questions():
-    questions = []
-    for crop, pests in pest_advice.items():
-        for pest, advice in pests.items():
-            q1 = f"How can farmers control {pest} in {crop}?"
-            a1 = advice
-            questions.append({"input": q1, "output": a1})
-
-            q2 = f"What is the best way to manage {pest} when growing {crop}?"
-            a2 = advice
-            questions.append({"input": q2, "output": a2})
-    return questions
+    return [
+        {"input": template.format(pest=pest, crop=crop), "output": advice}
+        for crop, pests in pest_advice.items()
+        for pest, advice in pests.items()
+        for template in PEST_TEMPLATES
+    ]
 
 
 def generate_fertilizer_questions():
-    questions = []
-    for crop, advice in fertilizer_advice.items():
-        q1 = f"What is the recommended fertilizer schedule for {crop}?"
-        questions.append({"input": q1, "output": advice})
-
-        q2 = f"How much fertilizer should I apply for {crop} cultivation?"
-        questions.append({"input": q2, "output": advice})
-    return questions
+    return [
+        {"input": template.format(crop=crop), "output": advice}
+        for crop, advice in fertilizer_advice.items()
+        for template in FERTILIZER_TEMPLATES
+    ]
 
 
 def generate_subsidy_questions():
-    questions = []
-    for scheme, desc in subsidy_info.items():
-        q1 = f"What is the {scheme} scheme for farmers?"
-        questions.append({"input": q1, "output": desc})
-
-        q2 = f"Can farmers get benefits from {scheme}?"
-        questions.append({"input": q2, "output": desc})
-    return questions
+    return [
+        {"input": template.format(scheme=scheme), "output": desc}
+        for scheme, desc in subsidy_info.items()
+        for template in SUBSIDY_TEMPLATES
+    ]
 
 
 def generate_market_questions():
-    questions = []
-    for crop, price in market_prices.items():
-        q1 = f"What is the current MSP of {crop}?"
-        questions.append({"input": q1, "output": price})
-
-        q2 = f"How much does {crop} sell for in the market?"
-        questions.append({"input": q2, "output": price})
-    return questions
+    return [
+        {"input": template.format(crop=crop), "output": price}
+        for crop, price in market_prices.items()
+        for template in MARKET_TEMPLATES
+    ]
 
 
 # -----------------------------
 # Generate Q&A Pairs
 # -----------------------------
-qa_pairs = []
+def generate_qa_pairs(crop_df):
+    qa_pairs = []
 
-# From soil dataset
-for _, row in soil_df.iterrows():
-    qa_pairs.extend(generate_soil_questions(row))
+    # From soil dataset
+    qa_pairs.extend(generate_soil_questions(soil_df))
 
-# From crop production dataset
-for _, row in crop_df.iterrows():
-    qa_pairs.extend(generate_production_questions(row))
+    # From crop production dataset
+    qa_pairs.extend(generate_production_questions(crop_df))
 
-# Add knowledge-based Q&A
-qa_pairs.extend(generate_weather_questions())
-qa_pairs.extend(generate_pest_questions())
-qa_pairs.extend(generate_fertilizer_questions())
-qa_pairs.extend(generate_subsidy_questions())
-qa_pairs.extend(generate_market_questions())
+    # Add knowledge-based Q&A
+    qa_pairs.extend(generate_weather_questions())
+    qa_pairs.extend(generate_pest_questions())
+    qa_pairs.extend(generate_fertilizer_questions())
+    qa_pairs.extend(generate_subsidy_questions())
+    qa_pairs.extend(generate_market_questions())
 
-# Shuffle dataset for variety
-random.shuffle(qa_pairs)
+    return qa_pairs
 
-# -----------------------------
-# Save to JSONL
-# -----------------------------
-output_file = "farmer_qa_dataset.jsonl"
-with open(output_file, "w", encoding="utf-8") as f:
-    for item in qa_pairs:
-        f.write(json.dumps(item, ensure_ascii=False) + "\n")
 
-print(f"✅ Generated {len(qa_pairs)} Q&A pairs and saved to {output_file}")
+def dedupe_qa_pairs(qa_pairs):
+    """Drop repeated (input, output) pairs, keeping the first occurrence"""
+    seen = set()
+    unique = []
+    for item in qa_pairs:
+        key = (item["input"], item["output"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(item)
+    return unique
+
+
+def is_stale(csv_path=CROP_CSV_PATH, output_file=OUTPUT_FILE):
+    """The JSONL needs rebuilding if it is missing or older than the CSV"""
+    if not os.path.exists(output_file):
+        return True
+    return os.path.getmtime(csv_path) > os.path.getmtime(output_file)
+
+
+def build_dataset(csv_path=CROP_CSV_PATH, output_file=OUTPUT_FILE, force=False):
+    """Generate the JSONL dataset, skipping the work when it is already up to date"""
+    if not force and not is_stale(csv_path, output_file):
+        print(f"✅ {output_file} is up to date")
+        return None
+
+    crop_df = pd.read_csv(csv_path, usecols=CROP_COLUMNS, dtype=CROP_DTYPES, engine=CSV_ENGINE)
+    generated = generate_qa_pairs(crop_df)
+    qa_pairs = dedupe_qa_pairs(generated)
+
+    # -----------------------------
+    # Save to JSONL
+    # -----------------------------
+    # Shuffle for variety by writing in a permuted order (computed in NumPy) instead
+    # of reordering the list itself. orjson emits UTF-8 bytes directly; writelines
+    # lets the buffered file batch the syscalls
+    order = np.random.default_rng().permutation(len(qa_pairs))
+    with open(output_file, "wb") as f:
+        f.writelines(orjson.dumps(qa_pairs[i]) + b"\n" for i in order)
+
+    print(f"✅ Generated {len(qa_pairs)} Q&A pairs ({len(generated) - len(qa_pairs)} duplicates dropped) and saved to {output_file}")
+    return qa_pairs
+
+
+if __name__ == "__main__":
+    import sys
+    build_dataset(force="--force" in sys.argv)
@@ -5,7 +5,13 @@ from .system_routes import system_bp
 
 def register_routes(app):
     """Register all route blueprints"""
+    # Accept paths with or without a trailing slash instead of answering with a 308 redirect
+    app.url_map.strict_slashes = False
+    
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
     app.register_blueprint(audio_bp, url_prefix='/api/audio')
-    app.register_blueprint(system_bp, url_prefix='/api')
\ No newline at end of file
+    app.register_blueprint(system_bp, url_prefix='/api')
+    
+    # Build the matcher now rather than on the first request
+    app.url_map.update()
\ No newline at end of file
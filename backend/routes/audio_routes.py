@@ -1,24 +1,47 @@
 import os
 import uuid
-import time
+import shutil
+from secrets import token_hex
 from flask import Blueprint, request, jsonify, send_file, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from extensions import db
-from models import User, ChatSession, ChatMessage, AudioFile
-from services.translation_service import TranslationService
-from services.location_service import LocationService
-from services.speech_service import SpeechService
-from services.llm_service import AgriculturalLLMService
-from services.weather_service import WeatherService
+from models import ChatSession, ChatMessage, AudioFile, VoiceJob
+from services.registry import (
+    get_speech_service, get_translation_service, get_weather_service,
+    get_location_service, get_llm_service
+)
 
 logger = logging.getLogger(__name__)
 
 audio_bp = Blueprint('audio', __name__)
 
+# Overlaps the network-bound lookups of a request with its other work
+_io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='audio-io')
+
+# Runs async voice queries outside the request; state lives in voice_jobs so any worker can report it
+_job_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='voice-job')
+
+# A queued/running job untouched this long was lost with its worker (restart, OOM kill)
+VOICE_JOB_TIMEOUT = timedelta(minutes=10)
+
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+def _save_upload(file_storage, path):
+    """Stream an uploaded file to disk in large chunks; returns the bytes written"""
+    with open(path, 'wb', buffering=UPLOAD_CHUNK_SIZE) as out:
+        shutil.copyfileobj(file_storage.stream, out, length=UPLOAD_CHUNK_SIZE)
+        return out.tell()
+
+def _fetch_weather(location_service, weather_service, location):
+    """Geocode then fetch weather; independent of the spoken query"""
+    lat, lon = location_service.get_coordinates(location)
+    return weather_service.get_weather(lat, lon)
+
 @audio_bp.route('/upload', methods=['POST'])
 @jwt_required()
 def upload_audio():
@@ -33,16 +56,17 @@ def upload_audio():
         if audio_file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Initialize speech service
-        speech_service = SpeechService(current_app.config['UPLOAD_FOLDER'])
+        # Shared speech service
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        speech_service = get_speech_service(upload_folder)
         
         # Generate secure filename
         original_filename = secure_filename(audio_file.filename)
-        filename = f"audio_{user_id}_{uuid.uuid4().hex}.wav"
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        filename = f"audio_{user_id}_{token_hex(16)}.wav"
+        file_path = os.path.join(upload_folder, filename)
         
         # Save file
-        audio_file.save(file_path)
+        file_size = _save_upload(audio_file, file_path)
         
         # Convert speech to text
         language = request.form.get('language', 'en-US')
@@ -57,7 +81,7 @@ def upload_audio():
             original_filename=original_filename,
             file_path=file_path,
             file_type='input',
-            file_size=os.path.getsize(file_path)
+            file_size=file_size
         )
         db.session.add(audio_record)
         db.session.commit()
@@ -69,7 +93,7 @@ def upload_audio():
         }), 200
         
     except Exception as e:
-        logger.error(f"Audio upload error: {e}")
+        logger.error("Audio upload error: %s", e)
         return jsonify({'error': 'Failed to process audio'}), 500
 
 @audio_bp.route('/generate', methods=['POST'])
@@ -84,35 +108,31 @@ def generate_audio():
         if not text:
             return jsonify({'error': 'Text is required'}), 400
         
-        # Initialize speech service
-        speech_service = SpeechService(current_app.config['UPLOAD_FOLDER'])
+        # Shared speech service
+        speech_service = get_speech_service(current_app.config['UPLOAD_FOLDER'])
         
         # Generate audio file
-        audio_path = speech_service.text_to_speech(text, language)
+        tts_result = speech_service.text_to_speech(text, language)
         
-        if not audio_path:
+        if not tts_result:
             return jsonify({'error': 'Failed to generate audio'}), 500
         
         # Save audio file record
-        filename = os.path.basename(audio_path)
         audio_record = AudioFile(
-            filename=filename,
-            original_filename=f"tts_{int(time.time())}.mp3",
-            file_path=audio_path,
-            file_type='output',
-            file_size=os.path.getsize(audio_path)
+            original_filename=f"tts_{int(tts_result.created_at)}.mp3",
+            **tts_result.to_audio_kwargs()
         )
         db.session.add(audio_record)
         db.session.commit()
         
         return jsonify({
             'audio_file_id': audio_record.id,
-            'filename': filename,
+            'filename': tts_result.filename,
             'download_url': f'/api/audio/download/{audio_record.id}'
         }), 200
         
     except Exception as e:
-        logger.error(f"Audio generation error: {e}")
+        logger.error("Audio generation error: %s", e)
         return jsonify({'error': 'Failed to generate audio'}), 500
 
 @audio_bp.route('/download/<int:audio_id>')
@@ -120,7 +140,7 @@ def generate_audio():
 def download_audio(audio_id):
     """Download audio file"""
     try:
-        audio_file = AudioFile.query.get(audio_id)
+        audio_file = db.session.get(AudioFile, audio_id)
         
         if not audio_file:
             return jsonify({'error': 'Audio file not found'}), 404
@@ -128,162 +148,264 @@ def download_audio(audio_id):
         if not os.path.exists(audio_file.file_path):
             return jsonify({'error': 'Audio file not found on disk'}), 404
         
-        return send_file(
+        # Conditional: ETag/Last-Modified 304s and Range requests for seeking.
+        # With USE_X_SENDFILE the proxy streams the bytes instead of this worker.
+        response = send_file(
             audio_file.file_path,
             as_attachment=True,
             download_name=audio_file.original_filename,
-            mimetype='audio/mpeg'
+            mimetype='audio/mpeg',
+            conditional=True,
+            max_age=3600
         )
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
         
     except Exception as e:
-        logger.error(f"Audio download error: {e}")
+        logger.error("Audio download error: %s", e)
         return jsonify({'error': 'Failed to download audio'}), 500
 
+class VoiceQueryError(Exception):
+    """A voice query that cannot be answered; carries the HTTP status"""
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+def _run_voice_query(user_id, audio_path, filename, original_filename, audio_size,
+                     location, language, session_id, weather_future):
+    """
+    STT -> LLM -> TTS for a saved recording. Persists the exchange and returns
+    the response payload; needs an app context but no request.
+    """
+    config = current_app.config
+    speech_service = get_speech_service(config['UPLOAD_FOLDER'])
+    translation_service = get_translation_service()
+    llm_service = get_llm_service(config.get('GOOGLE_API_KEY'))
+    
+    # Convert speech to text
+    speech_lang = 'en-US' if language == 'en' else f'{language}-IN'
+    query_text = speech_service.speech_to_text(audio_path, speech_lang)
+    
+    if not query_text:
+        raise VoiceQueryError('Could not recognize speech', 400)
+    
+    # Get or create chat session
+    session = None
+    if session_id:
+        session = ChatSession.get_for_user(session_id, user_id)
+    
+    if not session:
+        session = ChatSession(
+            user_id=user_id,
+            session_id=str(uuid.uuid4()),
+            title=query_text[:50] + ('...' if len(query_text) > 50 else '')
+        )
+        db.session.add(session)
+    
+    # Detect and process language
+    detected_lang = translation_service.detect_language(query_text)
+    english_query = query_text
+    if detected_lang != 'en':
+        english_query = translation_service.translate_to_english(query_text, detected_lang)
+    
+    # Get weather and location data
+    weather_info = weather_future.result()
+    
+    # Generate AI response
+    ai_response = llm_service.generate_response(english_query, location, weather_info)
+    
+    # Translate response back to detected language
+    if detected_lang != 'en':
+        ai_response = translation_service.translate_from_english(ai_response, detected_lang)
+    
+    # Generate audio response
+    tts_lang = detected_lang if detected_lang in ['hi', 'en', 'mr', 'gu', 'ta', 'te', 'kn', 'bn'] else 'en'
+    tts_result = speech_service.text_to_speech(ai_response, tts_lang)
+    
+    # Save input audio record
+    input_audio = AudioFile(
+        filename=filename,
+        original_filename=original_filename,
+        file_path=audio_path,
+        file_type='input',
+        file_size=audio_size
+    )
+    
+    # Save output audio record
+    output_audio = None
+    if tts_result:
+        output_audio = AudioFile(
+            original_filename=f'response_{int(tts_result.created_at)}.mp3',
+            **tts_result.to_audio_kwargs()
+        )
+    
+    # Messages attach through the relationship, so a new session needs no early flush
+    user_message = ChatMessage(
+        session=session,
+        message_type='user',
+        content=query_text,
+        original_language=detected_lang,
+        input_type='voice',
+        audio_file_path=audio_path,
+        location=location,
+        weather_data=weather_info
+    )
+    ai_message = ChatMessage(
+        session=session,
+        message_type='assistant',
+        content=ai_response,
+        original_language=detected_lang,
+        audio_file_path=tts_result.path if tts_result else None,
+        location=location,
+        weather_data=weather_info
+    )
+    
+    # Update session
+    session.updated_at = datetime.utcnow()
+    
+    # One flush for every new row; ids are read before commit expires them
+    db.session.add_all([obj for obj in (input_audio, output_audio, user_message, ai_message) if obj])
+    db.session.flush()
+    session_pk = session.id
+    input_audio_id = input_audio.id
+    output_audio_id = output_audio.id if output_audio else None
+    db.session.commit()
+    
+    return {
+        'session_id': session_pk,
+        'recognized_text': query_text,
+        'response_text': ai_response,
+        'language': detected_lang,
+        'location': location,
+        'weather': weather_info,
+        'input_audio_id': input_audio_id,
+        'output_audio_id': output_audio_id,
+        'audio_download_url': f'/api/audio/download/{output_audio_id}' if output_audio_id else None
+    }
+
+def _run_voice_job(app, job_id, **query_args):
+    """Background-job wrapper around _run_voice_query that records the outcome on the VoiceJob row"""
+    with app.app_context():
+        job = db.session.get(VoiceJob, job_id)
+        if job.status != 'queued':
+            # Already given up on by the status endpoint while it waited in the queue
+            return
+        job.status = 'running'
+        db.session.commit()
+        
+        try:
+            result, error = _run_voice_query(**query_args), None
+        except VoiceQueryError as e:
+            db.session.rollback()
+            result, error = None, str(e)
+        except Exception as e:
+            logger.error("Voice query job %s failed: %s", job_id, e)
+            db.session.rollback()
+            result, error = None, 'Failed to process voice query'
+        
+        job = db.session.get(VoiceJob, job_id)
+        job.status = 'failed' if error else 'done'
+        job.result = result
+        job.error = error
+        db.session.commit()
+
 @audio_bp.route('/voice-query', methods=['POST'])
 @jwt_required()
 def process_voice_query():
-    """Process voice input and generate audio response"""
+    """
+    Process voice input and generate audio response.
+    With form field async=true the work runs in the background: the reply is
+    202 with a job id to poll at /voice-query/status/<job_id>.
+    """
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        # Profile defaults from the cached user the JWT lookup already loaded
+        default_location, default_language = current_user.location, current_user.preferred_language
         
         # Check for audio file upload
         if 'audio' not in request.files:
             return jsonify({'error': 'No audio file provided'}), 400
         
         audio_file = request.files['audio']
-        location = request.form.get('location', user.location)
+        location = request.form.get('location', default_location)
         session_id = request.form.get('session_id')
-        language = request.form.get('language', user.preferred_language)
+        language = request.form.get('language', default_language)
+        run_async = request.form.get('async', '').lower() in ('1', 'true', 'yes')
         
         if not location:
             return jsonify({'error': 'Location is required'}), 400
         
-        # Initialize services
-        speech_service = SpeechService(current_app.config['UPLOAD_FOLDER'])
-        translation_service = TranslationService()
-        weather_service = WeatherService(current_app.config.get('WEATHER_API_KEY', ''))
-        location_service = LocationService(current_app.config.get('WEATHER_API_KEY', ''))
-        llm_service = AgriculturalLLMService(current_app.config.get('GOOGLE_API_KEY'))
-        
-        if not llm_service:
+        config = current_app.config
+        if not get_llm_service(config.get('GOOGLE_API_KEY')):
             return jsonify({'error': 'AI service not available'}), 503
         
-        # Save uploaded audio
-        filename = f"voice_{user_id}_{uuid.uuid4().hex}.wav"
-        audio_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        audio_file.save(audio_path)
-        
-        # Convert speech to text
-        speech_lang = 'en-US' if language == 'en' else f'{language}-IN'
-        query_text = speech_service.speech_to_text(audio_path, speech_lang)
+        # Weather only depends on the location, so fetch it while speech is recognized
+        weather_api_key = config.get('WEATHER_API_KEY', '')
+        weather_service = get_weather_service(weather_api_key)
+        location_service = get_location_service(weather_api_key)
+        weather_future = _io_executor.submit(_fetch_weather, location_service, weather_service, location)
         
-        if not query_text:
-            return jsonify({'error': 'Could not recognize speech'}), 400
+        # Save uploaded audio
+        filename = f"voice_{user_id}_{token_hex(16)}.wav"
+        audio_path = os.path.join(config['UPLOAD_FOLDER'], filename)
+        audio_size = _save_upload(audio_file, audio_path)
         
-        # Get or create chat session
-        session = None
-        if session_id:
-            session = ChatSession.query.filter_by(id=session_id, user_id=user_id).first()
-        
-        if not session:
-            session = ChatSession(
-                user_id=user_id,
-                session_id=str(uuid.uuid4()),
-                title=query_text[:50] + ('...' if len(query_text) > 50 else '')
-            )
-            db.session.add(session)
-            db.session.flush()
-        
-        # Detect and process language
-        detected_lang = translation_service.detect_language(query_text)
-        english_query = query_text
-        if detected_lang != 'en':
-            english_query = translation_service.translate_to_english(query_text, detected_lang)
-        
-        # Get weather and location data
-        lat, lon = location_service.get_coordinates(location)
-        weather_info = weather_service.get_weather(lat, lon)
-        
-        # Generate AI response
-        ai_response = llm_service.generate_response(english_query, location, weather_info)
-        
-        # Translate response back to detected language
-        if detected_lang != 'en':
-            ai_response = translation_service.translate_from_english(ai_response, detected_lang)
-        
-        # Generate audio response
-        tts_lang = detected_lang if detected_lang in ['hi', 'en', 'mr', 'gu', 'ta', 'te', 'kn', 'bn'] else 'en'
-        audio_response_path = speech_service.text_to_speech(ai_response, tts_lang)
-        
-        # Save input audio record
-        input_audio = AudioFile(
+        query_args = dict(
+            user_id=user_id,
+            audio_path=audio_path,
             filename=filename,
             original_filename=audio_file.filename or 'voice_input.wav',
-            file_path=audio_path,
-            file_type='input',
-            file_size=os.path.getsize(audio_path)
-        )
-        db.session.add(input_audio)
-        
-        # Save output audio record
-        output_audio = None
-        if audio_response_path:
-            output_filename = os.path.basename(audio_response_path)
-            output_audio = AudioFile(
-                filename=output_filename,
-                original_filename=f'response_{int(time.time())}.mp3',
-                file_path=audio_response_path,
-                file_type='output',
-                file_size=os.path.getsize(audio_response_path)
-            )
-            db.session.add(output_audio)
-        
-        # Save user message
-        user_message = ChatMessage(
-            session_id=session.id,
-            message_type='user',
-            content=query_text,
-            original_language=detected_lang,
-            input_type='voice',
-            audio_file_path=audio_path,
-            location=location,
-            weather_data=weather_info
-        )
-        db.session.add(user_message)
-        
-        # Save AI response
-        ai_message = ChatMessage(
-            session_id=session.id,
-            message_type='assistant',
-            content=ai_response,
-            original_language=detected_lang,
-            audio_file_path=audio_response_path,
+            audio_size=audio_size,
             location=location,
-            weather_data=weather_info
+            language=language,
+            session_id=session_id,
+            weather_future=weather_future
         )
-        db.session.add(ai_message)
-        
-        # Update session
-        session.updated_at = datetime.utcnow()
-        db.session.commit()
         
-        return jsonify({
-            'session_id': session.id,
-            'recognized_text': query_text,
-            'response_text': ai_response,
-            'language': detected_lang,
-            'location': location,
-            'weather': weather_info,
-            'input_audio_id': input_audio.id,
-            'output_audio_id': output_audio.id if output_audio else None,
-            'audio_download_url': f'/api/audio/download/{output_audio.id}' if output_audio else None
-        }), 200
+        if run_async:
+            job = VoiceJob(id=token_hex(16), user_id=user_id, status='queued')
+            db.session.add(job)
+            db.session.commit()
+            _job_executor.submit(_run_voice_job, current_app._get_current_object(), job.id, **query_args)
+            return jsonify({
+                'job_id': job.id,
+                'status': 'queued',
+                'status_url': f'/api/audio/voice-query/status/{job.id}'
+            }), 202
+        
+        try:
+            return jsonify(_run_voice_query(**query_args)), 200
+        except VoiceQueryError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), e.status
         
     except Exception as e:
-        logger.error(f"Voice query processing error: {e}")
+        logger.error("Voice query processing error: %s", e)
         db.session.rollback()
-        return jsonify({'error': 'Failed to process voice query'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to process voice query'}), 500
+
+@audio_bp.route('/voice-query/status/<job_id>', methods=['GET'])
+@jwt_required()
+def voice_query_status(job_id):
+    """Poll a background voice query started with async=true"""
+    try:
+        user_id = get_jwt_identity()
+        job = db.session.get(VoiceJob, job_id)
+        
+        if not job or job.user_id != int(user_id):
+            return jsonify({'error': 'Job not found'}), 404
+        
+        # Jobs run in a worker's memory; if that worker died, stop the client polling forever
+        if job.status in ('queued', 'running') and job.updated_at < datetime.utcnow() - VOICE_JOB_TIMEOUT:
+            logger.warning("Voice query job %s stalled in %s; marking it failed", job.id, job.status)
+            job.status = 'failed'
+            job.error = 'Voice query was interrupted; please try again'
+            db.session.commit()
+        
+        return jsonify(job.to_dict()), 200
+        
+    except Exception as e:
+        logger.error("Voice query status error: %s", e)
+        return jsonify({'error': 'Failed to get job status'}), 500
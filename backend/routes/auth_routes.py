@@ -1,15 +1,22 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import create_access_token, jwt_required, current_user
+from sqlalchemy import update, func
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 import logging
 
 from extensions import db
-from models import User
+from models import User, dummy_password_check
+from services.user_cache import invalidate_user
 
 logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 
+def _issue_token(user):
+    """Access token for `user`; the subject must be a string (PyJWT rejects int `sub`)"""
+    return create_access_token(identity=str(user.id))
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -22,14 +29,7 @@ def register():
             if not data.get(field):
                 return jsonify({'error': f'{field} is required'}), 400
         
-        # Check if user already exists
-        if User.query.filter_by(login_id=data['login_id']).first():
-            return jsonify({'error': 'Login ID already exists'}), 409
-        
-        if User.query.filter_by(email=data['email']).first():
-            return jsonify({'error': 'Email already registered'}), 409
-        
-        # Create new user
+        # Create new user; the unique constraints on login_id and email reject duplicates
         user = User(
             login_id=data['login_id'],
             email=data['email'],
@@ -41,21 +41,31 @@ def register():
         user.set_password(data['password'])
         
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         
         # Create access token with user ID as string
-        access_token = create_access_token(identity=str(user.id))
+        access_token = _issue_token(user)
+        # Serialized before commit expires the row, so it is not re-read
+        user_data = user.to_dict()
+        db.session.commit()
         
-        logger.info(f"User registered successfully: {user.login_id}, ID: {user.id}")
+        logger.info("User registered successfully: %s, ID: %s", user_data['login_id'], user_data['id'])
         
         return jsonify({
             'message': 'User registered successfully',
             'access_token': access_token,
-            'user': user.to_dict()
+            'user': user_data
         }), 201
         
+    except IntegrityError:
+        db.session.rollback()
+        # Only on conflict: find out which field was taken
+        if User.query.filter_by(login_id=data['login_id']).first():
+            return jsonify({'error': 'Login ID already exists'}), 409
+        return jsonify({'error': 'Email already registered'}), 409
+        
     except Exception as e:
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Registration failed'}), 500
 
@@ -70,7 +80,12 @@ def login():
         
         user = User.query.filter_by(login_id=data['login_id']).first()
         
-        if not user or not user.check_password(data['password']):
+        # Unknown login_id and wrong password look the same: same error, same bcrypt cost
+        if not user:
+            dummy_password_check(data['password'])
+            return jsonify({'error': 'Invalid credentials'}), 401
+        
+        if not user.check_password(data['password']):
             return jsonify({'error': 'Invalid credentials'}), 401
         
         if not user.is_active:
@@ -78,12 +93,14 @@ def login():
         
         # Update last login
         user.last_login = datetime.utcnow()
+        user.bump_profile_version()
         db.session.commit()
+        invalidate_user(user.id)
         
         # Create access token with user ID as string
-        access_token = create_access_token(identity=str(user.id))
+        access_token = _issue_token(user)
         
-        logger.info(f"User logged in successfully: {user.login_id}, ID: {user.id}")
+        logger.info("User logged in successfully: %s, ID: %s", user.login_id, user.id)
         
         return jsonify({
             'message': 'Login successful',
@@ -92,7 +109,7 @@ def login():
         }), 200
         
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         return jsonify({'error': 'Login failed'}), 500
 
 @auth_bp.route('/profile', methods=['GET'])
@@ -100,33 +117,21 @@ def login():
 def get_profile():
     """Get user profile"""
     try:
-        # Get user ID from JWT token
-        user_id_str = get_jwt_identity()
-        logger.info(f"Getting profile for user ID: {user_id_str}")
-        
-        # Convert to integer
-        try:
-            user_id = int(user_id_str)
-        except (ValueError, TypeError) as e:
-            logger.error(f"Invalid user ID format: {user_id_str}, error: {e}")
-            return jsonify({'error': 'Invalid token format'}), 401
-        
-        # Fetch user from database
-        user = User.query.get(user_id)
-        
-        if not user:
-            logger.warning(f"User not found for ID: {user_id}")
-            return jsonify({'error': 'User not found'}), 404
+        # Cached snapshot loaded by the JWT user lookup (see app.py)
+        user = current_user
         
         if not user.is_active:
-            logger.warning(f"Inactive user attempted profile access: {user_id}")
+            logger.warning("Inactive user attempted profile access: %s", user.id)
             return jsonify({'error': 'Account is deactivated'}), 401
         
-        logger.info(f"Profile fetched successfully for user: {user.login_id}")
-        return jsonify({'user': user.to_dict()}), 200
+        logger.info("Profile fetched successfully for user: %s", user.login_id)
+        # The snapshot carries its JSON already; splice it in rather than re-encoding
+        return current_app.response_class(
+            b'{"user":' + user.json_bytes + b'}', status=200, mimetype='application/json'
+        )
         
     except Exception as e:
-        logger.error(f"Profile fetch error: {e}")
+        logger.error("Profile fetch error: %s", e)
         return jsonify({'error': 'Failed to fetch profile'}), 500
 
 @auth_bp.route('/profile', methods=['PUT'])
@@ -134,26 +139,11 @@ def get_profile():
 def update_profile():
     """Update user profile"""
     try:
-        # Get user ID from JWT token
-        user_id_str = get_jwt_identity()
-        logger.info(f"Updating profile for user ID: {user_id_str}")
-        
-        # Convert to integer - this was the main bug in your original code
-        try:
-            user_id = int(user_id_str)
-        except (ValueError, TypeError) as e:
-            logger.error(f"Invalid user ID format: {user_id_str}, error: {e}")
-            return jsonify({'error': 'Invalid token format'}), 401
-        
-        # Fetch user from database
-        user = User.query.get(user_id)
-        
-        if not user:
-            logger.warning(f"User not found for ID: {user_id}")
-            return jsonify({'error': 'User not found'}), 404
+        user = current_user
+        logger.info("Updating profile for user ID: %s", user.id)
         
         if not user.is_active:
-            logger.warning(f"Inactive user attempted profile update: {user_id}")
+            logger.warning("Inactive user attempted profile update: %s", user.id)
             return jsonify({'error': 'Account is deactivated'}), 401
         
         data = request.get_json()
@@ -163,30 +153,43 @@ def update_profile():
         
         # Update allowed fields
         updatable_fields = ['name', 'phone_number', 'preferred_language', 'location']
-        updated_fields = []
-        
-        for field in updatable_fields:
-            if field in data:
-                old_value = getattr(user, field)
-                new_value = data[field]
-                if old_value != new_value:
-                    setattr(user, field, new_value)
-                    updated_fields.append(field)
-        
-        if updated_fields:
-            db.session.commit()
-            logger.info(f"Profile updated successfully for user: {user.login_id}, fields: {updated_fields}")
-        else:
-            logger.info(f"No changes made to profile for user: {user.login_id}")
+        updates = {field: data[field] for field in updatable_fields if field in data}
+        updated_fields = [field for field in updates if getattr(user, field) != updates[field]]
+        
+        if not updates:
+            logger.info("No changes made to profile for user: %s", user.login_id)
+            return jsonify({
+                'message': 'Profile updated successfully',
+                'user': user.to_dict(),
+                'updated_fields': updated_fields
+            }), 200
+        
+        # One UPDATE ... RETURNING instead of loading the row and diffing it in Python
+        updated = db.session.execute(
+            update(User).where(User.id == user.id)
+            .values(**updates, profile_version=func.coalesce(User.profile_version, 0) + 1)
+            .returning(User)
+        ).scalar_one_or_none()
+        
+        if not updated:
+            db.session.rollback()
+            logger.warning("User not found for ID: %s", user.id)
+            return jsonify({'error': 'User not found'}), 404
+        
+        # Serialized before commit expires the row, so it is not re-read
+        user_data = updated.to_dict()
+        db.session.commit()
+        invalidate_user(user.id)
+        logger.info("Profile updated successfully for user: %s, fields: %s", user.login_id, updated_fields)
         
         return jsonify({
             'message': 'Profile updated successfully',
-            'user': user.to_dict(),
+            'user': user_data,
             'updated_fields': updated_fields
         }), 200
         
     except Exception as e:
-        logger.error(f"Profile update error: {e}")
+        logger.error("Profile update error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to update profile'}), 500
 
@@ -195,23 +198,10 @@ def update_profile():
 def validate_token():
     """Validate JWT token and return user info"""
     try:
-        user_id_str = get_jwt_identity()
-        logger.info(f"Validating token for user ID: {user_id_str}")
-        
-        try:
-            user_id = int(user_id_str)
-        except (ValueError, TypeError) as e:
-            logger.error(f"Invalid user ID format: {user_id_str}, error: {e}")
-            return jsonify({'error': 'Invalid token format'}), 401
-        
-        user = User.query.get(user_id)
-        
-        if not user:
-            logger.warning(f"User not found for ID: {user_id}")
-            return jsonify({'error': 'User not found'}), 404
+        user = current_user
         
         if not user.is_active:
-            logger.warning(f"Inactive user token validation: {user_id}")
+            logger.warning("Inactive user token validation: %s", user.id)
             return jsonify({'error': 'Account is deactivated'}), 401
         
         return jsonify({
@@ -221,5 +211,5 @@ def validate_token():
         }), 200
         
     except Exception as e:
-        logger.error(f"Token validation error: {e}")
+        logger.error("Token validation error: %s", e)
         return jsonify({'error': 'Token validation failed', 'valid': False}), 500
\ No newline at end of file
@@ -1,133 +1,275 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, Response, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
+from sqlalchemy.orm import undefer
 from datetime import datetime
 import uuid
 import logging
 import traceback
-import json
+import orjson
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from extensions import db
-from models import User, ChatSession, ChatMessage, AudioFile
-from services.translation_service import TranslationService
-from services.location_service import LocationService
-from services.speech_service import SpeechService
-from services.llm_service import AgriculturalLLMService
-from services.weather_service import WeatherService
+from models import ChatSession, ChatMessage, AudioFile, tts_content_hash
+from services.registry import (
+    get_speech_service, get_translation_service, get_weather_service,
+    get_location_service, get_llm_service, get_response_cache
+)
+from services.llm_cache import RESPONSE_TTL, response_key
+from services.llm_service import FallbackResponse
 
 logger = logging.getLogger(__name__)
 
 chat_bp = Blueprint('chat', __name__)
 
-# Initialize services
-translation_service = TranslationService()
+# Shared services (see services.registry)
+translation_service = get_translation_service()
+
+# Expected types of the optional /query body fields, checked in one pass before extraction
+CHAT_QUERY_FIELDS = {
+    'query': str,
+    'location': str,
+    'language': str,
+    'session_id': (int, str),
+    'generate_audio': bool,
+    'stream': bool,
+    'lat': (int, float),
+    'lon': (int, float),
+    'audio_languages': list
+}
+CHAT_QUERY_TYPE_NAMES = {
+    str: 'a string', bool: 'a boolean', (int, str): 'an integer or string', (int, float): 'a number',
+    list: 'a list'
+}
+
+# Geocoding and weather run here while the request thread handles the session and translation
+_io_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='chat-io')
+
+def _lookup_weather(location_service, weather_service, location, coordinates=None):
+    """
+    Geocode then fetch weather; independent of the query text. Returns (lat, lon, weather).
+    Coordinates sent by the client skip geocoding.
+    """
+    lat, lon = coordinates if coordinates is not None else location_service.get_coordinates(location)
+    if lat is not None and lon is not None:
+        return lat, lon, weather_service.get_weather(lat, lon)
+    return lat, lon, None
+
+def _reusable_audio(content_hashes):
+    """Earlier TTS outputs by content hash, where the file is still on disk"""
+    if not content_hashes:
+        return {}
+    found = {}
+    for audio_file in AudioFile.query.filter(AudioFile.content_hash.in_(content_hashes),
+                                             AudioFile.file_type == 'output'):
+        if audio_file.content_hash not in found and os.path.exists(audio_file.file_path):
+            found[audio_file.content_hash] = audio_file
+    return found
+
+def _audio_file_record(tts_future, label, content_hash):
+    """
+    Unsaved AudioFile row for a finished text_to_speech call, or None if it
+    produced nothing usable. The TTSResult already carries size and mtime.
+    """
+    if tts_future is None:
+        return None
+    try:
+        result = tts_future.result()
+    except Exception as e:
+        logger.error("Audio generation failed for %s: %s", label, e)
+        return None
+    if not result:
+        logger.warning("Failed to generate %s audio", label)
+        return None
+    return AudioFile(
+        original_filename=f'response_{label}_{int(result.created_at)}.mp3',
+        content_hash=content_hash,
+        **result.to_audio_kwargs()
+    )
+
+# Streamed replies are saved after the last text event, off the request thread;
+# a save may wait on the reply's TTS, so there is headroom beyond one per request
+_save_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='chat-save')
+
+def _sse(event_type, payload):
+    """One Server-Sent Events frame carrying a JSON object"""
+    return b'data: ' + orjson.dumps({'type': event_type, **payload}, default=str) + b'\n\n'
+
+def _save_exchange(app, session_pk, query, response_text, language, location, weather_info,
+                   audio_future=None, audio_hash=None, audio_path=None):
+    """Persist a streamed query and its reply. Returns the id of newly stored reply audio, if any"""
+    with app.app_context():
+        try:
+            audio_file = _audio_file_record(audio_future, language, audio_hash)
+            session = db.session.get(ChatSession, session_pk)
+            session.updated_at = datetime.utcnow()
+            db.session.add_all([
+                ChatMessage(session=session, message_type='user', content=query, original_language=language,
+                            input_type='text', location=location, weather_data=weather_info),
+                ChatMessage(session=session, message_type='assistant', content=response_text,
+                            original_language=language, location=location, weather_data=weather_info,
+                            audio_file_path=audio_file.file_path if audio_file else audio_path),
+                *([audio_file] if audio_file else [])
+            ])
+            db.session.flush()
+            audio_id = audio_file.id if audio_file else None
+            db.session.commit()
+            return audio_id
+        except Exception as e:
+            logger.error("Saving streamed chat exchange failed: %s", e)
+            db.session.rollback()
+            return None
+
+def _sse_audio(audio_id):
+    """'audio' event pointing at a stored reply audio file"""
+    return _sse('audio', {'audio_file_id': audio_id, 'audio_url': f'/api/audio/download/{audio_id}'})
+
+def _stream_chat_response(llm_service, speech_service, session_pk, query, english_query, location,
+                          weather_info, input_language, cache_key):
+    """
+    Reply as Server-Sent Events: a 'meta' event, a 'token' event per model
+    chunk (a single one for a cached answer), then 'done' with the cleaned
+    (and translated) response. With a speech service, TTS of the reply starts
+    before 'done' and a final 'audio' event carries its download URL.
+    """
+    app = current_app._get_current_object()
+    
+    def generate():
+        yield _sse('meta', {
+            'session_id': session_pk,
+            'language': input_language,
+            'location': location,
+            'weather': weather_info
+        })
+        
+        response_cache = get_response_cache()
+        response = response_cache.get(cache_key) if cache_key else None
+        if response is not None:
+            yield _sse('token', {'text': response})
+        else:
+            parts = []
+            for chunk in llm_service.generate_response_stream(english_query, location, weather_info or {}):
+                parts.append(chunk)
+                if chunk:
+                    yield _sse('token', {'text': chunk})
+            response = llm_service.finish_stream(parts)
+            # Fallback, cut-off or too-short text is a one-off; caching it would repeat the failure for an hour
+            if cache_key and not isinstance(response, FallbackResponse):
+                response_cache.set(cache_key, response, expire=RESPONSE_TTL)
+        
+        translated_response = response
+        if input_language != 'en':
+            try:
+                translated_response = translation_service.translate_from_english(response, input_language) or response
+            except Exception as translation_error:
+                logger.warning("Response translation error: %s", translation_error)
+        
+        # Audio in the user's language, reusing an earlier file of the same text when there is one
+        audio_future = audio_hash = reused_audio = None
+        if speech_service and translated_response and translated_response.strip():
+            try:
+                tts_lang_code = speech_service.get_tts_language_code(input_language)
+                audio_hash = tts_content_hash(translated_response, tts_lang_code)
+                with app.app_context():
+                    reused = _reusable_audio([audio_hash]).get(audio_hash)
+                    reused_audio = (reused.id, reused.file_path) if reused else None
+                if not reused_audio:
+                    audio_future = _io_executor.submit(speech_service.text_to_speech, translated_response, tts_lang_code)
+            except Exception as audio_error:
+                logger.error("Audio generation error: %s", audio_error)
+        
+        # Submitted before 'done' so the exchange is saved even if the client goes away
+        save_future = _save_executor.submit(_save_exchange, app, session_pk, query, translated_response,
+                                            input_language, location, weather_info, audio_future, audio_hash,
+                                            reused_audio[1] if reused_audio else None)
+        yield _sse('done', {'response': translated_response, 'original_response': response})
+        
+        if reused_audio:
+            yield _sse_audio(reused_audio[0])
+        elif audio_future is not None:
+            audio_id = save_future.result()
+            if audio_id:
+                yield _sse_audio(audio_id)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @chat_bp.route('/query', methods=['POST'])
+@chat_bp.route('/query/stream', methods=['POST'], defaults={'force_stream': True})
 @jwt_required()
-def process_chat_query():
-    """Process agricultural query and generate both text and audio response"""
+def process_chat_query(force_stream=False):
+    """
+    Process agricultural query and generate both text and audio response.
+    With "stream": true (or via /query/stream) the reply is Server-Sent Events instead.
+    """
     try:
-        logger.info("Processing chat query request")
+        logger.debug("Processing chat query request")
         
-        user_id = get_jwt_identity()
-        logger.info(f"User ID: {user_id}")
+        user = current_user
+        user_id = user.id
+        logger.debug("User ID: %s", user_id)
         
-        user = User.query.get(user_id)
-        if not user:
-            logger.error(f"User not found: {user_id}")
-            return jsonify({'error': 'User not found'}), 404
+        logger.debug("User found: %s", user.email)
         
-        logger.info(f"User found: {user.email}")
+        # Parse the body exactly once, whatever the Content-Type header claims
+        raw_data = request.get_data()
+        if not raw_data:
+            logger.error("No request data found")
+            return jsonify({
+                'error': 'No data in request',
+                'details': 'Request body is empty'
+            }), 400
         
-        # Enhanced JSON parsing
         try:
-            content_type = request.headers.get('Content-Type', '').lower()
-            logger.info(f"Content-Type header: '{content_type}'")
-            
-            if not request.data:
-                logger.error("No request data found")
-                return jsonify({
-                    'error': 'No data in request',
-                    'details': 'Request body is empty'
-                }), 400
-            
-            raw_data = request.get_data(as_text=True)
-            logger.info(f"Raw request data: {raw_data}")
-            
-            data = None
-            
-            # Try different parsing methods
-            if 'application/json' in content_type:
-                try:
-                    data = request.get_json()
-                    logger.info("Successfully parsed JSON with get_json()")
-                except Exception as e1:
-                    logger.warning(f"get_json() failed: {e1}")
-            
-            if data is None:
-                try:
-                    data = request.get_json(force=True)
-                    logger.info("Successfully parsed JSON with get_json(force=True)")
-                except Exception as e2:
-                    logger.warning(f"get_json(force=True) failed: {e2}")
-            
-            if data is None:
-                try:
-                    data = json.loads(raw_data)
-                    logger.info("Successfully parsed JSON with json.loads()")
-                except json.JSONDecodeError as e3:
-                    logger.error(f"JSON decode error: {e3}")
-                    return jsonify({
-                        'error': 'Invalid JSON syntax',
-                        'details': f'{e3.msg} at line {e3.lineno}, column {e3.colno}',
-                        'received_data': raw_data[:200] + '...' if len(raw_data) > 200 else raw_data
-                    }), 400
-                except Exception as e3:
-                    logger.error(f"Manual JSON parsing failed: {e3}")
-                    return jsonify({
-                        'error': 'JSON parsing failed',
-                        'details': str(e3)
-                    }), 400
-            
-            if data is None:
-                logger.error("All JSON parsing methods failed")
-                return jsonify({
-                    'error': 'Unable to parse JSON',
-                    'details': 'All parsing methods failed'
-                }), 400
-            
-            logger.info(f"Parsed JSON data: {data}")
-            
-        except Exception as json_error:
-            logger.error(f"JSON processing error: {json_error}")
+            data = orjson.loads(raw_data)
+        except orjson.JSONDecodeError as decode_error:
+            logger.error("JSON decode error: %s", decode_error)
+            received = raw_data.decode('utf-8', 'replace')
             return jsonify({
-                'error': 'JSON processing failed',
-                'details': str(json_error)
+                'error': 'Invalid JSON syntax',
+                'details': f'{decode_error.msg} at line {decode_error.lineno}, column {decode_error.colno}',
+                'received_data': received[:200] + '...' if len(received) > 200 else received
             }), 400
         
+        logger.debug("Parsed JSON data: %s", data)
+        
         # Extract and validate fields
-        try:
-            if not isinstance(data, dict):
-                return jsonify({
-                    'error': 'Invalid data format',
-                    'details': f'Expected JSON object, got {type(data).__name__}'
-                }), 400
-            
-            query = data.get('query', '').strip() if data.get('query') else ''
-            location = data.get('location', '').strip() if data.get('location') else ''
-            session_id = data.get('session_id')
-            input_language = data.get('language', 'en').strip() if data.get('language') else 'en'
-            generate_audio = data.get('generate_audio', True)
-            
-            logger.info(f"Extracted - Query: '{query}', Location: '{location}', Language: '{input_language}'")
-            
-        except Exception as extract_error:
-            logger.error(f"Field extraction error: {extract_error}")
+        if not isinstance(data, dict):
             return jsonify({
-                'error': 'Field extraction failed',
-                'details': str(extract_error)
+                'error': 'Invalid data format',
+                'details': f'Expected JSON object, got {type(data).__name__}'
             }), 400
         
+        for field, expected in CHAT_QUERY_FIELDS.items():
+            value = data.get(field)
+            if value is not None and not isinstance(value, expected):
+                return jsonify({
+                    'error': 'Field extraction failed',
+                    'details': f"'{field}' must be {CHAT_QUERY_TYPE_NAMES[expected]}"
+                }), 400
+        
+        query = (data.get('query') or '').strip()
+        location = (data.get('location') or '').strip()
+        session_id = data.get('session_id')
+        input_language = (data.get('language') or '').strip() or 'en'
+        generate_audio = data.get('generate_audio', True)
+        stream = force_stream or bool(data.get('stream', False))
+        # Clients that already know where they are can send coordinates with the place name
+        lat, lon = data.get('lat'), data.get('lon')
+        coordinates = None
+        if lat is not None and lon is not None:
+            # bool passes the int check above; 0 is a valid coordinate
+            if isinstance(lat, bool) or isinstance(lon, bool) or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                return jsonify({
+                    'error': 'Invalid coordinates',
+                    'details': "'lat' must be a number in [-90, 90] and 'lon' in [-180, 180]"
+                }), 400
+            coordinates = (lat, lon)
+        # Languages the client will actually play; by default both English and the query language
+        audio_languages = data.get('audio_languages')
+        
+        logger.debug("Extracted - Query: '%s', Location: '%s', Language: '%s'", query, location, input_language)
+        
         # Validation
         if not query:
             return jsonify({
@@ -159,22 +301,25 @@ def process_chat_query():
                 logger.error("Google API key is missing")
                 return jsonify({'error': 'AI service not configured'}), 503
             
-            weather_service = WeatherService(weather_api_key)
-            location_service = LocationService(weather_api_key)
-            llm_service = AgriculturalLLMService(google_api_key)
-            speech_service = SpeechService(current_app.config.get('UPLOAD_FOLDER', '/tmp'))
+            weather_service = get_weather_service(weather_api_key)
+            location_service = get_location_service(weather_api_key)
+            llm_service = get_llm_service(google_api_key)
+            speech_service = get_speech_service(current_app.config.get('UPLOAD_FOLDER', '/tmp'))
             
-            logger.info(f"Services initialized successfully")
+            logger.debug("Services initialized successfully")
             
         except Exception as service_error:
-            logger.error(f"Service initialization error: {service_error}")
+            logger.error("Service initialization error: %s", service_error)
             return jsonify({'error': 'Failed to initialize services'}), 503
         
+        # Start location and weather now; collected after the query is translated
+        weather_future = _io_executor.submit(_lookup_weather, location_service, weather_service, location, coordinates)
+        
         # Get or create chat session
         session = None
         try:
             if session_id:
-                session = ChatSession.query.filter_by(id=session_id, user_id=user_id).first()
+                session = ChatSession.get_for_user(session_id, user_id)
             
             if not session:
                 session = ChatSession(
@@ -182,12 +327,12 @@ def process_chat_query():
                     session_id=str(uuid.uuid4()),
                     title=query[:50] + ('...' if len(query) > 50 else '')
                 )
+                # Inserted with the messages; no flush needed until then
                 db.session.add(session)
-                db.session.flush()
-                logger.info(f"New session created with ID: {session.id}")
+                logger.debug("New session created")
                 
         except Exception as session_error:
-            logger.error(f"Session handling error: {session_error}")
+            logger.error("Session handling error: %s", session_error)
             db.session.rollback()
             return jsonify({'error': 'Failed to create session'}), 500
         
@@ -196,51 +341,75 @@ def process_chat_query():
         try:
             if not input_language or input_language == 'auto':
                 input_language = translation_service.detect_language(query)
-                logger.info(f"Detected language: {input_language}")
+                logger.debug("Detected language: %s", input_language)
             
             if input_language != 'en':
-                logger.info("Translating query to English...")
+                logger.debug("Translating query to English...")
                 # FIXED: Use correct method signature
                 english_query = translation_service.translate_to_english(query, input_language)
-                logger.info(f"Translated query: {english_query}")
+                logger.debug("Translated query: %s", english_query)
                 
         except Exception as translation_error:
-            logger.warning(f"Translation error: {translation_error}")
+            logger.warning("Translation error: %s", translation_error)
             english_query = query
             input_language = 'en'
         
         # Get location and weather data
-        weather_info = None
+        lat = lon = weather_info = None
         try:
-            lat, lon = location_service.get_coordinates(location)
-            if lat and lon:
-                weather_info = weather_service.get_weather(lat, lon)
+            lat, lon, weather_info = weather_future.result()
         except Exception as location_error:
-            logger.warning(f"Location/Weather error: {location_error}")
+            logger.warning("Location/Weather error: %s", location_error)
             weather_info = {'error': 'Weather data unavailable'}
         
+        # Same question, place and weather bucket: same advice (shared with the Streamlit app's cache)
+        cache_key = (response_key(english_query, location, lat, lon, weather_info)
+                     if lat is not None and lon is not None else None)
+        
+        if stream:
+            # The session must exist before the first event carries its id
+            try:
+                db.session.flush()
+                session_pk = session.id
+                db.session.commit()
+            except Exception as session_error:
+                logger.error("Session handling error: %s", session_error)
+                db.session.rollback()
+                return jsonify({'error': 'Failed to create session'}), 500
+            return _stream_chat_response(llm_service, speech_service if generate_audio else None,
+                                         session_pk, query, english_query,
+                                         location, weather_info, input_language, cache_key)
+        
         # Generate AI response
         try:
-            logger.info("Generating AI response...")
-            response = llm_service.generate_response(english_query, location, weather_info or {})
-            
-            if not response or not response.strip():
-                logger.error("Empty response from LLM service")
-                return jsonify({'error': 'Failed to generate response'}), 500
+            response_cache = get_response_cache()
+            response = response_cache.get(cache_key) if cache_key else None
+            if response is not None:
+                logger.debug("AI response served from cache")
+            else:
+                logger.debug("Generating AI response...")
+                response = llm_service.generate_response(english_query, location, weather_info or {})
+                
+                if not response or not response.strip():
+                    logger.error("Empty response from LLM service")
+                    return jsonify({'error': 'Failed to generate response'}), 500
                 
-            logger.info(f"AI response generated: {len(response)} characters")
+                if cache_key and not isinstance(response, FallbackResponse):
+                    response_cache.set(cache_key, response, expire=RESPONSE_TTL)
+                
+            logger.debug("AI response generated: %s characters", len(response))
             
         except Exception as llm_error:
-            logger.error(f"LLM generation error: {llm_error}")
+            logger.error("LLM generation error: %s", llm_error)
             return jsonify({'error': 'AI service temporarily unavailable'}), 500
         
         # Translate response back if needed - FIXED LOGIC
         translated_response = response
         try:
             if input_language != 'en':
-                logger.info(f"Translating response back to {input_language}...")
+                logger.debug("Translating response back to %s...", input_language)
                 translated_response = translation_service.translate_from_english(response, input_language)
-                logger.info(f"Translated response: {translated_response}")
+                logger.debug("Translated response: %s", translated_response)
                 
                 # Ensure we actually got a translation
                 if not translated_response or translated_response.strip() == response.strip():
@@ -248,7 +417,7 @@ def process_chat_query():
                     translated_response = response
                 
         except Exception as translation_error:
-            logger.warning(f"Response translation error: {translation_error}")
+            logger.warning("Response translation error: %s", translation_error)
             translated_response = response
         
         # ENHANCED AUDIO GENERATION WITH COMPLETE ERROR HANDLING
@@ -256,136 +425,70 @@ def process_chat_query():
         translated_audio_file_id = None
         audio_download_url = None
         translated_audio_download_url = None
+        original_audio_file = None
+        translated_audio_file = None
+        new_audio_files = []
         
         if generate_audio and speech_service:
             try:
-                logger.info("Starting audio generation process...")
+                logger.debug("Starting audio generation process...")
                 
                 # Check speech service status first
                 service_status = speech_service.get_service_status()
-                logger.info(f"Speech service status: {service_status}")
+                logger.debug("Speech service status: %s", service_status)
                 
                 if not service_status.get('folder_writable', False):
-                    logger.error(f"Upload folder not writable: {service_status.get('upload_folder')}")
+                    logger.error("Upload folder not writable: %s", service_status.get('upload_folder'))
                     # Continue without audio generation
                 else:
-                    # Generate original audio (English) - For reference/debugging
-                    original_audio_file = None
-                    if response and response.strip():
-                        try:
-                            logger.info("Generating English audio response...")
-                            logger.info(f"English text to convert: {response[:100]}...")
-                            
-                            original_audio_path = speech_service.text_to_speech(response, 'en')
-                            logger.info(f"English audio path returned: {original_audio_path}")
-                            
-                            if original_audio_path and os.path.exists(original_audio_path):
-                                if speech_service.validate_audio_file(original_audio_path):
-                                    original_audio_file = AudioFile(
-                                        filename=os.path.basename(original_audio_path),
-                                        original_filename=f'response_en_{int(datetime.now().timestamp())}.mp3',
-                                        file_path=original_audio_path,
-                                        file_type='output',
-                                        file_size=os.path.getsize(original_audio_path)
-                                    )
-                                    db.session.add(original_audio_file)
-                                    db.session.flush()
-                                    audio_file_id = original_audio_file.id
-                                    audio_download_url = f'/api/audio/download/{audio_file_id}'
-                                    logger.info(f"Original English audio saved with ID: {audio_file_id}")
-                                else:
-                                    logger.warning("English audio file validation failed")
-                            else:
-                                logger.warning(f"Failed to generate English audio. Path: {original_audio_path}, Exists: {os.path.exists(original_audio_path) if original_audio_path else False}")
-                                
-                        except Exception as en_audio_error:
-                            logger.error(f"English audio generation failed: {en_audio_error}")
-                            logger.error(f"English audio error traceback: {traceback.format_exc()}")
+                    # English (reference) and translated (primary) audio
+                    english_hash = None
+                    if response and response.strip() and (audio_languages is None or 'en' in audio_languages):
+                        english_hash = tts_content_hash(response, 'en')
+                    
+                    translated_hash = None
+                    if (translated_response and translated_response.strip() and input_language != 'en'
+                            and (audio_languages is None or input_language in audio_languages)):
+                        tts_lang_code = speech_service.get_tts_language_code(input_language)
+                        logger.debug("Using TTS language code: %s", tts_lang_code)
+                        translated_hash = tts_content_hash(translated_response, tts_lang_code)
+                    
+                    # Replies repeat; reuse earlier audio of the same text and language
+                    reusable = _reusable_audio([h for h in (english_hash, translated_hash) if h])
                     
-                    # Generate translated audio (Primary audio for user)
-                    translated_audio_file = None
-                    if translated_response and translated_response.strip() and input_language != 'en':
-                        try:
-                            logger.info(f"Generating {input_language} audio response...")
-                            logger.info(f"Translated text to convert: {translated_response[:100]}...")
-                            
-                            # Use the speech service TTS language mapping
-                            tts_lang_code = speech_service.get_tts_language_code(input_language)
-                            logger.info(f"Using TTS language code: {tts_lang_code}")
-                            
-                            translated_audio_path = speech_service.text_to_speech(translated_response, tts_lang_code)
-                            logger.info(f"Translated audio path returned: {translated_audio_path}")
-                            
-                            if translated_audio_path and os.path.exists(translated_audio_path):
-                                if speech_service.validate_audio_file(translated_audio_path):
-                                    translated_audio_file = AudioFile(
-                                        filename=os.path.basename(translated_audio_path),
-                                        original_filename=f'response_{input_language}_{int(datetime.now().timestamp())}.mp3',
-                                        file_path=translated_audio_path,
-                                        file_type='output',
-                                        file_size=os.path.getsize(translated_audio_path)
-                                    )
-                                    db.session.add(translated_audio_file)
-                                    db.session.flush()
-                                    translated_audio_file_id = translated_audio_file.id
-                                    translated_audio_download_url = f'/api/audio/download/{translated_audio_file_id}'
-                                    logger.info(f"Translated {input_language} audio saved with ID: {translated_audio_file_id}")
-                                else:
-                                    logger.warning(f"Translated {input_language} audio file validation failed")
-                            else:
-                                logger.warning(f"Failed to generate {input_language} audio. Path: {translated_audio_path}, Exists: {os.path.exists(translated_audio_path) if translated_audio_path else False}")
-                                
-                        except Exception as trans_audio_error:
-                            logger.error(f"Translated audio generation failed: {trans_audio_error}")
-                            logger.error(f"Translated audio error traceback: {traceback.format_exc()}")
+                    # What is left to synthesize runs concurrently
+                    english_future = None
+                    if english_hash and english_hash not in reusable:
+                        english_future = _io_executor.submit(speech_service.text_to_speech, response, 'en')
+                    translated_future = None
+                    if translated_hash and translated_hash not in reusable:
+                        translated_future = _io_executor.submit(speech_service.text_to_speech, translated_response, tts_lang_code)
                     
-                    # If we didn't generate translated audio but user language isn't English,
-                    # try generating audio in user's language with the final response
-                    elif input_language != 'en' and translated_response and translated_response.strip():
-                        try:
-                            logger.info(f"Generating fallback {input_language} audio...")
-                            logger.info(f"Fallback text to convert: {translated_response[:100]}...")
-                            
-                            tts_lang_code = speech_service.get_tts_language_code(input_language)
-                            logger.info(f"Using fallback TTS language code: {tts_lang_code}")
-                            
-                            fallback_audio_path = speech_service.text_to_speech(translated_response, tts_lang_code)
-                            logger.info(f"Fallback audio path returned: {fallback_audio_path}")
-                            
-                            if fallback_audio_path and os.path.exists(fallback_audio_path):
-                                if speech_service.validate_audio_file(fallback_audio_path):
-                                    translated_audio_file = AudioFile(
-                                        filename=os.path.basename(fallback_audio_path),
-                                        original_filename=f'response_{input_language}_fallback_{int(datetime.now().timestamp())}.mp3',
-                                        file_path=fallback_audio_path,
-                                        file_type='output',
-                                        file_size=os.path.getsize(fallback_audio_path)
-                                    )
-                                    db.session.add(translated_audio_file)
-                                    db.session.flush()
-                                    translated_audio_file_id = translated_audio_file.id
-                                    translated_audio_download_url = f'/api/audio/download/{translated_audio_file_id}'
-                                    logger.info(f"Fallback {input_language} audio saved with ID: {translated_audio_file_id}")
-                                else:
-                                    logger.warning(f"Fallback {input_language} audio file validation failed")
-                        except Exception as fallback_error:
-                            logger.error(f"Fallback audio generation failed: {fallback_error}")
-                            logger.error(f"Fallback audio error traceback: {traceback.format_exc()}")
+                    original_audio_file = reusable.get(english_hash) or _audio_file_record(
+                        english_future, 'en', english_hash)
+                    translated_audio_file = reusable.get(translated_hash) or _audio_file_record(
+                        translated_future, input_language, translated_hash)
+                    
+                    # New rows are inserted with the messages, in the same flush
+                    new_audio_files = [f for f in (original_audio_file, translated_audio_file) if f and f.id is None]
                 
                 # Log final audio status
-                logger.info(f"Audio generation complete - English: {'✓' if audio_file_id else '✗'}, {input_language}: {'✓' if translated_audio_file_id else '✗'}")
+                logger.debug("Audio generation complete - English: %s, %s: %s", '✓' if original_audio_file else '✗', input_language, '✓' if translated_audio_file else '✗')
                 
             except Exception as audio_error:
-                logger.error(f"Audio generation error: {audio_error}")
-                logger.error(f"Audio error traceback: {traceback.format_exc()}")
+                logger.error("Audio generation error: %s", audio_error)
+                logger.error("Audio error traceback: %s", traceback.format_exc())
                 # Continue without audio - don't fail the entire request
         else:
-            logger.info(f"Audio generation skipped - generate_audio: {generate_audio}, speech_service available: {speech_service is not None}")
+            logger.debug("Audio generation skipped - generate_audio: %s, speech_service available: %s", generate_audio, speech_service is not None)
         
         # Save messages to database
         try:
+            session.updated_at = datetime.utcnow()
+            
+            # Linked through the relationship so a new session and both messages go out in one flush
             user_message = ChatMessage(
-                session_id=session.id,
+                session=session,
                 message_type='user',
                 content=query,
                 original_language=input_language,
@@ -393,10 +496,9 @@ def process_chat_query():
                 location=location,
                 weather_data=weather_info
             )
-            db.session.add(user_message)
             
             ai_message = ChatMessage(
-                session_id=session.id,
+                session=session,
                 message_type='assistant',
                 content=translated_response,
                 original_language=input_language,
@@ -404,21 +506,31 @@ def process_chat_query():
                 weather_data=weather_info,
                 audio_file_path=original_audio_file.file_path if original_audio_file else None
             )
-            db.session.add(ai_message)
             
-            session.updated_at = datetime.utcnow()
+            # Ids are read before commit expires them
+            db.session.add_all([user_message, ai_message, *new_audio_files])
+            db.session.flush()
+            session_pk = session.id
+            user_message_id = user_message.id
+            ai_message_id = ai_message.id
+            if original_audio_file:
+                audio_file_id = original_audio_file.id
+                audio_download_url = f'/api/audio/download/{audio_file_id}'
+            if translated_audio_file:
+                translated_audio_file_id = translated_audio_file.id
+                translated_audio_download_url = f'/api/audio/download/{translated_audio_file_id}'
             db.session.commit()
-            logger.info("Messages and audio files saved to database successfully")
+            logger.debug("Messages and audio files saved to database successfully")
             
         except Exception as db_error:
-            logger.error(f"Database save error: {db_error}")
-            logger.error(f"DB error traceback: {traceback.format_exc()}")
+            logger.error("Database save error: %s", db_error)
+            logger.error("DB error traceback: %s", traceback.format_exc())
             db.session.rollback()
             return jsonify({'error': 'Failed to save conversation'}), 500
         
         # Prepare response data - FIXED STRUCTURE
         response_data = {
-            'session_id': session.id,
+            'session_id': session_pk,
             'query': query,
             'response': translated_response,  # Primary response in user's language
             'response_text': translated_response,
@@ -427,8 +539,8 @@ def process_chat_query():
             'detected_language': input_language,
             'location': location,
             'weather': weather_info,
-            'user_message_id': user_message.id,
-            'ai_message_id': ai_message.id,
+            'user_message_id': user_message_id,
+            'ai_message_id': ai_message_id,
             'response_language': input_language,  # Changed from 'en'
             'translation_language': input_language,
         }
@@ -441,13 +553,13 @@ def process_chat_query():
             response_data['audio_file_id'] = translated_audio_file_id
             response_data['translated_audio_url'] = translated_audio_download_url
             response_data['translated_audio_file_id'] = translated_audio_file_id
-            logger.info(f"Added translated audio URL to response: {translated_audio_download_url}")
+            logger.debug("Added translated audio URL to response: %s", translated_audio_download_url)
         elif audio_download_url:
             # Fallback to English audio if no translated audio available
             response_data['audio_url'] = audio_download_url
             response_data['audio_download_url'] = audio_download_url
             response_data['audio_file_id'] = audio_file_id
-            logger.info(f"Added English audio URL to response: {audio_download_url}")
+            logger.debug("Added English audio URL to response: %s", audio_download_url)
         
         # Add both audio URLs if both exist
         if audio_download_url and translated_audio_download_url:
@@ -459,12 +571,12 @@ def process_chat_query():
             response_data['translated_text'] = translated_response
             response_data['original_english_text'] = response
         
-        logger.info(f"Returning successful response with audio status - Primary: {'✓' if response_data.get('audio_url') else '✗'}")
+        logger.debug("Returning successful response with audio status - Primary: %s", '✓' if response_data.get('audio_url') else '✗')
         return jsonify(response_data), 200
         
     except Exception as e:
-        logger.error(f"Unexpected error in chat query processing: {e}")
-        logger.error(f"Full traceback: {traceback.format_exc()}")
+        logger.error("Unexpected error in chat query processing: %s", e)
+        logger.error("Full traceback: %s", traceback.format_exc())
         try:
             db.session.rollback()
         except:
@@ -486,19 +598,12 @@ def get_chat_sessions():
         user_id = get_jwt_identity()
         sessions = ChatSession.query.filter_by(user_id=user_id).order_by(ChatSession.updated_at.desc()).all()
         
-        sessions_data = []
-        for session in sessions:
-            sessions_data.append({
-                'id': session.id,
-                'title': session.title,
-                'created_at': session.created_at.isoformat(),
-                'updated_at': session.updated_at.isoformat()
-            })
+        sessions_data = [session.to_summary_dict() for session in sessions]
         
         return jsonify({'sessions': sessions_data}), 200
         
     except Exception as e:
-        logger.error(f"Failed to get chat sessions: {e}")
+        logger.error("Failed to get chat sessions: %s", e)
         return jsonify({'error': 'Failed to get chat sessions'}), 500
 
 
@@ -519,21 +624,32 @@ def create_chat_session():
         db.session.add(session)
         db.session.commit()
         
-        return jsonify({
-            'session': {
-                'id': session.id,
-                'title': session.title,
-                'created_at': session.created_at.isoformat(),
-                'updated_at': session.updated_at.isoformat()
-            }
-        }), 201
+        return jsonify({'session': session.to_summary_dict()}), 201
         
     except Exception as e:
-        logger.error(f"Failed to create chat session: {e}")
+        logger.error("Failed to create chat session: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to create chat session'}), 500
 
 
+@chat_bp.route('/sessions/<int:session_id>', methods=['GET'])
+@jwt_required()
+def get_chat_session(session_id):
+    """Get a single chat session with its message count"""
+    try:
+        user_id = get_jwt_identity()
+        
+        session = ChatSession.get_for_user(session_id, user_id, options=[undefer(ChatSession.message_count)])
+        if not session:
+            return jsonify({'error': 'Session not found'}), 404
+        
+        return jsonify({'session': session.to_full_dict()}), 200
+        
+    except Exception as e:
+        logger.error("Failed to get chat session: %s", e)
+        return jsonify({'error': 'Failed to get chat session'}), 500
+
+
 @chat_bp.route('/sessions/<int:session_id>/messages', methods=['GET'])
 @jwt_required()
 def get_chat_messages(session_id):
@@ -542,11 +658,19 @@ def get_chat_messages(session_id):
         user_id = get_jwt_identity()
         
         # Verify session belongs to user
-        session = ChatSession.query.filter_by(id=session_id, user_id=user_id).first()
+        session = ChatSession.get_for_user(session_id, user_id)
         if not session:
             return jsonify({'error': 'Session not found'}), 404
         
-        messages = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.created_at.asc()).all()
+        messages = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp.asc()).all()
+        
+        # One query for every audio record the page needs, not one per message
+        audio_paths = {message.audio_file_path for message in messages if message.audio_file_path}
+        audio_ids = {}
+        if audio_paths:
+            for audio_id, file_path in db.session.query(AudioFile.id, AudioFile.file_path) \
+                    .filter(AudioFile.file_path.in_(audio_paths)):
+                audio_ids.setdefault(file_path, audio_id)
         
         messages_data = []
         for message in messages:
@@ -554,7 +678,7 @@ def get_chat_messages(session_id):
                 'id': message.id,
                 'message_type': message.message_type,
                 'content': message.content,
-                'timestamp': message.created_at.isoformat(),
+                'timestamp': message.timestamp,
                 'original_language': message.original_language,
                 'input_type': message.input_type,
                 'location': message.location,
@@ -562,18 +686,16 @@ def get_chat_messages(session_id):
             }
             
             # Add audio URL if available
-            if message.audio_file_path and os.path.exists(message.audio_file_path):
-                # Find audio file record
-                audio_file = AudioFile.query.filter_by(file_path=message.audio_file_path).first()
-                if audio_file:
-                    message_data['audio_url'] = f'/api/audio/download/{audio_file.id}'
+            audio_id = audio_ids.get(message.audio_file_path)
+            if audio_id is not None and os.path.exists(message.audio_file_path):
+                message_data['audio_url'] = f'/api/audio/download/{audio_id}'
             
             messages_data.append(message_data)
         
         return jsonify({'messages': messages_data}), 200
         
     except Exception as e:
-        logger.error(f"Failed to get chat messages: {e}")
+        logger.error("Failed to get chat messages: %s", e)
         return jsonify({'error': 'Failed to get chat messages'}), 500
 
 
@@ -585,7 +707,7 @@ def delete_chat_session(session_id):
         user_id = get_jwt_identity()
         
         # Verify session belongs to user
-        session = ChatSession.query.filter_by(id=session_id, user_id=user_id).first()
+        session = ChatSession.get_for_user(session_id, user_id)
         if not session:
             return jsonify({'error': 'Session not found'}), 404
         
@@ -599,6 +721,6 @@ def delete_chat_session(session_id):
         return jsonify({'message': 'Session deleted successfully'}), 200
         
     except Exception as e:
-        logger.error(f"Failed to delete chat session: {e}")
+        logger.error("Failed to delete chat session: %s", e)
         db.session.rollback()
         return jsonify({'error': 'Failed to delete chat session'}), 500
\ No newline at end of file
@@ -1,13 +1,12 @@
 import os
 from flask import Blueprint, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, current_user
 from datetime import datetime, timedelta
 import logging
 
 from extensions import db
 from models import User, ChatSession, ChatMessage, AudioFile
-from services.llm_service import AgriculturalLLMService
-from services.speech_service import SpeechService
+from services.registry import get_llm_service, get_speech_service
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +23,11 @@ def health_check():
         db_status = 'unhealthy'
     
     # Check AI service
-    llm_service = AgriculturalLLMService(current_app.config.get('GOOGLE_API_KEY'))
+    llm_service = get_llm_service(current_app.config.get('GOOGLE_API_KEY'))
     ai_status = 'healthy' if llm_service else 'unavailable'
     
     # Check speech service
-    speech_service = SpeechService(current_app.config['UPLOAD_FOLDER'])
+    speech_service = get_speech_service(current_app.config['UPLOAD_FOLDER'])
     speech_status = 'healthy' if speech_service.recognizer else 'unavailable'
     
     return jsonify({
@@ -46,11 +45,8 @@ def health_check():
 def get_system_stats():
     """Get system statistics"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        user = current_user
+        user_id = user.id
         
         # User statistics
         user_sessions = ChatSession.query.filter_by(user_id=user_id).count()
@@ -77,7 +73,7 @@ def get_system_stats():
         }), 200
         
     except Exception as e:
-        logger.error(f"Stats fetch error: {e}")
+        logger.error("Stats fetch error: %s", e)
         return jsonify({'error': 'Failed to fetch statistics'}), 500
 
 @system_bp.route('/files/cleanup', methods=['POST'])
@@ -97,7 +93,7 @@ def cleanup_old_files():
                 db.session.delete(audio_file)
                 deleted_count += 1
             except Exception as e:
-                logger.error(f"Failed to delete file {audio_file.filename}: {e}")
+                logger.error("Failed to delete file %s: %s", audio_file.filename, e)
         
         db.session.commit()
         
@@ -107,6 +103,6 @@ def cleanup_old_files():
         }), 200
         
     except Exception as e:
-        logger.error(f"File cleanup error: {e}")
+        logger.error("File cleanup error: %s", e)
         db.session.rollback()
         return jsonify({'error': 'File cleanup failed'}), 500
\ No newline at end of file
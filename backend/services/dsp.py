@@ -0,0 +1,62 @@
+import math
+import numpy as np
+
+# Optional: numba JIT for the sample loops, numpy otherwise
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except Exception:
+    _NUMBA_AVAILABLE = False
+
+if _NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _rms(samples):
+        total = 0.0
+        for x in samples:
+            total += float(x) * float(x)
+        return math.sqrt(total / samples.shape[0])
+
+    @njit(cache=True, fastmath=True)
+    def _peak_block_rms(samples, block_size):
+        peak = 0.0
+        for start in range(0, samples.shape[0] - block_size + 1, block_size):
+            total = 0.0
+            for i in range(start, start + block_size):
+                total += float(samples[i]) * float(samples[i])
+            level = math.sqrt(total / block_size)
+            if level > peak:
+                peak = level
+        return peak
+else:
+    def _rms(samples):
+        return float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+
+    def _peak_block_rms(samples, block_size):
+        blocks = samples[:samples.size - samples.size % block_size].reshape(-1, block_size)
+        if blocks.size == 0:
+            return 0.0
+        return float(np.sqrt(np.mean(np.square(blocks, dtype=np.float64), axis=1)).max())
+
+def rms(samples: np.ndarray) -> float:
+    """Root-mean-square level of a block of PCM samples"""
+    if samples.size == 0:
+        return 0.0
+    return float(_rms(samples))
+
+def peak_block_rms(samples: np.ndarray, block_size: int) -> float:
+    """Highest RMS over consecutive blocks; speech stands out even in mostly silent clips"""
+    if samples.size < block_size:
+        return rms(samples)
+    return float(_peak_block_rms(samples, block_size))
+
+def pcm16(raw: bytes) -> np.ndarray:
+    """View little-endian 16-bit PCM bytes as an int16 array (no copy)"""
+    return np.frombuffer(raw, dtype=np.int16)
+
+def audio_peak_level(audio, block_ms: int = 50) -> float:
+    """
+    Loudest `block_ms` RMS of a SpeechRecognition AudioData, on the 16-bit
+    scale that Recognizer.energy_threshold uses.
+    """
+    block_size = max(1, audio.sample_rate * block_ms // 1000)
+    return peak_block_rms(pcm16(audio.get_raw_data(convert_width=2)), block_size)
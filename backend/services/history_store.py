@@ -0,0 +1,96 @@
+import os
+import queue
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+HISTORY_COLUMNS = ('timestamp', 'query', 'response', 'language', 'location', 'input_type')
+
+class HistoryStore:
+    """
+    Conversation history persisted to SQLite off the request path, one
+    history per owner (a browser session id). record() only enqueues; a
+    daemon thread writes queued rows in batches.
+    """
+    _CLEAR = object()
+
+    def __init__(self, db_path: str = "cache/history.db", flush_interval: float = 0.5):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "timestamp REAL, query TEXT, response TEXT, language TEXT, location TEXT, input_type TEXT, "
+                "owner TEXT)"
+            )
+            # Older files predate per-owner history; their unowned rows are never shown
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(history)")}
+            if 'owner' not in columns:
+                conn.execute("ALTER TABLE history ADD COLUMN owner TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_history_owner ON history (owner, id)")
+        self._queue = queue.Queue()
+        threading.Thread(target=self._writer, name="history-writer", daemon=True).start()
+
+    def record(self, owner: str, entry: dict):
+        """Queue a conversation entry of `owner` for persistence; never blocks"""
+        self._queue.put_nowait((owner, *(entry.get(column) for column in HISTORY_COLUMNS)))
+
+    def clear(self, owner: str):
+        """Drop the stored history of `owner` once the rows queued before it are written"""
+        self._queue.put_nowait((self._CLEAR, owner))
+
+    def recent(self, owner: str, limit: int = 50) -> list[dict]:
+        """Return the newest `limit` entries of `owner`, oldest first"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute(
+                    f"SELECT {', '.join(HISTORY_COLUMNS)} FROM history WHERE owner = ? ORDER BY id DESC LIMIT ?",
+                    (owner, limit)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"History read failed: {e}")
+            return []
+        entries = []
+        for row in reversed(rows):
+            entry = dict(zip(HISTORY_COLUMNS, row))
+            if entry['input_type'] is None:
+                del entry['input_type']
+            entries.append(entry)
+        return entries
+
+    def _writer(self):
+        conn = sqlite3.connect(self.db_path)
+        while True:
+            batch = [self._queue.get()]
+            # Collect whatever else arrives within the flush window
+            try:
+                while True:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            try:
+                self._flush(conn, batch)
+            except sqlite3.Error as e:
+                logger.warning(f"History write failed: {e}")
+
+    def _flush(self, conn, batch):
+        rows = []
+        for item in batch:
+            if item[0] is self._CLEAR:
+                owner = item[1]
+                rows = [row for row in rows if row[0] != owner]
+                conn.execute("DELETE FROM history WHERE owner = ?", (owner,))
+            else:
+                rows.append(item)
+        if rows:
+            conn.executemany(
+                f"INSERT INTO history (owner, {', '.join(HISTORY_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(HISTORY_COLUMNS) + 1))})",
+                rows
+            )
+        conn.commit()
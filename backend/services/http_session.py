@@ -0,0 +1,27 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 20
+
+def build_retry() -> Retry:
+    """Retry transient failures with a short exponential backoff"""
+    return Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET'])
+    )
+
+def create_session() -> requests.Session:
+    """requests.Session with a keep-alive connection pool and retries"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=build_retry()
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
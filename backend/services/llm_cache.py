@@ -0,0 +1,90 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Answers depend on the weather bucket in the key, so they only need to outlive a conversation
+RESPONSE_TTL = 3600
+# Translations of a fixed text are stable, but should not outlive a bad result forever
+TRANSLATION_TTL = 7 * 24 * 3600
+# Expired rows are deleted once every this many writes
+PRUNE_EVERY = 256
+
+class ResponseCache:
+    """
+    Persistent key/value cache for LLM responses and translations.
+    Backed by a single SQLite file; entries may carry an expiry time.
+    """
+    def __init__(self, db_path: str = "cache/llm_cache.db"):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)")
+        self._conn.commit()
+        self._writes = 0
+
+    def get(self, key: str):
+        """Return the cached value, or None if missing or expired"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at < time.time():
+                return None
+            return value
+        except sqlite3.Error as e:
+            logger.warning(f"Cache read failed: {e}")
+            return None
+
+    def set(self, key: str, value: str, expire: int | None = None):
+        """Store a value, optionally expiring after `expire` seconds"""
+        expires_at = time.time() + expire if expire else None
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                # Reads only skip expired rows; drop them now and then so the file stays bounded
+                self._writes += 1
+                if self._writes % PRUNE_EVERY == 0:
+                    self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache write failed: {e}")
+
+# ---------- Key Builders ----------
+def weather_bucket(weather_info: dict | None) -> str:
+    """Coarse weather bucket so small temperature changes still hit the cache"""
+    if not weather_info:
+        return "none"
+    temperature = weather_info.get('temperature')
+    temp_bucket = int(temperature // 5) if isinstance(temperature, (int, float)) else 'na'
+    return f"{weather_info.get('description', '')}:{temp_bucket}"
+
+def response_key(english_query: str, location: str, lat: float, lon: float, weather_info: dict | None) -> str:
+    """
+    Cache key for an LLM response to a query at a place under given weather.
+    The place name is part of the prompt, so it is keyed alongside the coordinates.
+    """
+    place = ' '.join(location.lower().split()) if location else ''
+    raw = f"{english_query.strip().lower()}|{place}|{round(lat, 2)}|{round(lon, 2)}|{weather_bucket(weather_info)}"
+    return "llm:" + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def translation_key(text: str, target_language: str) -> str:
+    """Cache key for a translation of `text` into `target_language`"""
+    return f"tr:{target_language}:" + hashlib.sha256(text.encode('utf-8')).hexdigest()
@@ -4,9 +4,22 @@ from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 import logging
 import re
-from typing import List, Dict, Optional
+import socket
+from typing import Iterator, List, Dict, Optional
 from services.vectordb import VectorDatabase
 
+GEMINI_API_HOST = "generativelanguage.googleapis.com"
+
+# Answers shorter than this are treated as failed generations
+MIN_RESPONSE_WORDS = 5
+
+class FallbackResponse(str):
+    """
+    A reply produced after the main generation failed (or a canned apology),
+    or a streamed reply that was cut off. It is still shown to the user, but
+    callers must not cache it.
+    """
+
 class AgriculturalLLMService:
     def __init__(self, api_key: str, vector_db: Optional[VectorDatabase] = None):
         try:
@@ -58,10 +71,22 @@ Response:
             logging.error(f"Failed to initialize Enhanced LLM service: {e}")
             raise
     
+    def warmup(self):
+        """
+        Resolve the Gemini host and send a tiny request so the first real
+        query reuses an already established connection
+        """
+        try:
+            socket.getaddrinfo(GEMINI_API_HOST, 443)
+            self.llm.invoke([HumanMessage(content="Reply with OK")])
+            logging.info("Gemini connection warmed up")
+        except Exception as e:
+            logging.warning(f"Gemini warmup failed: {e}")
+    
     def clean_response(self, response: str) -> str:
         """Clean and format the response"""
         if not response:
-            return "I couldn't generate a proper response. Please try again."
+            return FallbackResponse("I couldn't generate a proper response. Please try again.")
         
         # Remove special characters and symbols
         response = re.sub(r'[*#_`~\[\]{}|\\]', '', response)
@@ -134,7 +159,7 @@ Response:
             cleaned_response = self.clean_response(response)
             
             # Validate response quality
-            if len(cleaned_response.split()) < 5:
+            if len(cleaned_response.split()) < MIN_RESPONSE_WORDS:
                 return self._generate_fallback_response(query, location, weather_info)
             
             return cleaned_response
@@ -143,6 +168,48 @@ Response:
             logging.error(f"Enhanced LLM response generation failed: {e}")
             return self._generate_fallback_response(query, location, weather_info)
     
+    def generate_response_stream(self, query: str, location: str, weather_info: Dict) -> Iterator[str]:
+        """
+        Yield the response incrementally as the model produces it. If the model
+        fails before the first chunk, a single FallbackResponse is yielded instead;
+        if it fails later, an empty FallbackResponse marks the reply as truncated.
+        Pass the chunks to finish_stream() for the final text.
+        """
+        yielded = False
+        try:
+            context = self.get_relevant_context(query)
+            weather_str = self._format_weather(weather_info)
+            
+            for chunk in self.agricultural_chain.stream({
+                "query": query,
+                "location": location,
+                "weather": weather_str,
+                "context": context
+            }):
+                # Strip formatting markers per chunk; full cleanup happens on the joined text
+                chunk = re.sub(r'[*#_`~\[\]{}|\\]', '', chunk)
+                if chunk:
+                    yielded = True
+                    yield chunk
+                    
+        except Exception as e:
+            logging.error(f"Streaming LLM response failed: {e}")
+            if not yielded:
+                yield self._generate_fallback_response(query, location, weather_info)
+            else:
+                yield FallbackResponse('')
+    
+    def finish_stream(self, chunks: List[str]) -> str:
+        """
+        Cleaned full text of a streamed reply. It comes back as a FallbackResponse
+        when the stream fell back, was cut off, or is too short to be a real answer.
+        """
+        response = self.clean_response(''.join(chunks))
+        if (any(isinstance(chunk, FallbackResponse) for chunk in chunks)
+                or len(response.split()) < MIN_RESPONSE_WORDS):
+            return FallbackResponse(response)
+        return response
+    
     def _generate_fallback_response(self, query: str, location: str, weather_info: Dict) -> str:
         """Generate fallback response when main generation fails"""
         try:
@@ -157,11 +224,11 @@ Response:
             messages = [HumanMessage(content=fallback_prompt)]
             response = self.llm.invoke(messages)
             
-            return self.clean_response(response.content)
+            return FallbackResponse(self.clean_response(response.content))
             
         except Exception as e:
             logging.error(f"Fallback response generation failed: {e}")
-            return "I apologize, but I'm unable to provide a response right now. Please try again later or rephrase your question."
+            return FallbackResponse("I apologize, but I'm unable to provide a response right now. Please try again later or rephrase your question.")
     
     def batch_generate_responses(self, batch_data: List[Dict]) -> List[str]:
         """Generate responses for multiple queries efficiently"""
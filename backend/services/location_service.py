@@ -1,14 +1,44 @@
-import requests
+from functools import partial
+from geopy.adapters import RequestsAdapter
 from geopy.geocoders import Nominatim
 import logging
+import threading
+from cachetools import TTLCache
+from services.http_session import POOL_CONNECTIONS, POOL_MAXSIZE, build_retry
 
 class LocationService:
     def __init__(self, api_key):
         self.api_key = api_key
-        self.geocoder = Nominatim(user_agent="agricultural_chatbot", timeout= 10)
+        # geopy keeps its own requests session; give it the same pool and retry policy
+        self.geocoder = Nominatim(
+            user_agent="agricultural_chatbot",
+            timeout=10,
+            adapter_factory=partial(
+                RequestsAdapter,
+                pool_connections=POOL_CONNECTIONS,
+                pool_maxsize=POOL_MAXSIZE,
+                max_retries=build_retry()
+            )
+        )
+        # Place names repeat heavily (same user, same village) and rarely move; failures are not cached
+        self._cache = TTLCache(maxsize=10000, ttl=86400)
+        self._cache_lock = threading.Lock()
         
     def get_coordinates(self, location_name):
-        """Get latitude and longitude from location name"""
+        """Get latitude and longitude from location name (cached for 24 hours)"""
+        key = ' '.join(location_name.lower().split()) if location_name else location_name
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        
+        coordinates = self._geocode(location_name)
+        if coordinates[0] is not None:
+            with self._cache_lock:
+                self._cache[key] = coordinates
+        return coordinates
+    
+    def _geocode(self, location_name):
         try:
             # Using free Nominatim geocoder
             location = self.geocoder.geocode(location_name)
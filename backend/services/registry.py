@@ -0,0 +1,35 @@
+from functools import lru_cache
+from services.translation_service import TranslationService
+from services.location_service import LocationService
+from services.speech_service import SpeechService
+from services.llm_service import AgriculturalLLMService
+from services.weather_service import WeatherService
+from services.llm_cache import ResponseCache
+
+# Process-wide service instances, keyed by the config values they are built
+# from. Construction (HTTP pools, LLM client, recognizer) happens once per
+# worker instead of on every request.
+
+@lru_cache(maxsize=None)
+def get_speech_service(upload_folder: str) -> SpeechService:
+    return SpeechService(upload_folder)
+
+@lru_cache(maxsize=1)
+def get_translation_service() -> TranslationService:
+    return TranslationService()
+
+@lru_cache(maxsize=None)
+def get_weather_service(api_key: str) -> WeatherService:
+    return WeatherService(api_key)
+
+@lru_cache(maxsize=None)
+def get_location_service(api_key: str) -> LocationService:
+    return LocationService(api_key)
+
+@lru_cache(maxsize=None)
+def get_llm_service(api_key: str) -> AgriculturalLLMService:
+    return AgriculturalLLMService(api_key)
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+    return ResponseCache()
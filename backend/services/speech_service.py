@@ -2,7 +2,11 @@
 import os
 import uuid
 import logging
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
 from gtts import gTTS
+from services.dsp import audio_peak_level
 
 # Optional: use SpeechRecognition for Google/Sphinx recognition
 try:
@@ -13,6 +17,73 @@ except Exception:
 
 logger = logging.getLogger(__name__)
 
+# Speech models work at 16 kHz; anything above that is just upload size
+STT_SAMPLE_RATE = 16000
+
+# ---------- Language Tables ----------
+SR_LANGUAGES = {
+    'en': 'en-US',
+    'hi': 'hi-IN',
+    'mr': 'mr-IN',
+    'gu': 'gu-IN',
+    'pa': 'pa-IN',
+    'ta': 'ta-IN',
+    'te': 'te-IN',
+    'kn': 'kn-IN',
+    'bn': 'bn-IN',
+    'ur': 'ur-PK',
+    'ml': 'ml-IN',
+    'or': 'or-IN',
+    'as': 'as-IN',
+    'ne': 'ne-NP',
+}
+
+TTS_LANGUAGES = {
+    'en': 'en',
+    'hi': 'hi',
+    'mr': 'mr',
+    'gu': 'gu',
+    'pa': 'pa',
+    'ta': 'ta',
+    'te': 'te',
+    'kn': 'kn',
+    'bn': 'bn',
+    'ur': 'ur',
+    'ml': 'ml',
+    'ne': 'ne',
+}
+
+# The domain is the handful of UI languages, so each mapping is resolved
+# (and logged) once per process
+@lru_cache(maxsize=32)
+def _sr_language(lang_code: str) -> str:
+    result = SR_LANGUAGES.get(lang_code, 'en-US')
+    logger.info(f"SR Language mapping: {lang_code} -> {result}")
+    return result
+
+@lru_cache(maxsize=32)
+def _tts_language(lang_code: str) -> str:
+    result = TTS_LANGUAGES.get(lang_code, 'en')
+    logger.info(f"TTS Language mapping: {lang_code} -> {result}")
+    return result
+
+@dataclass(frozen=True)
+class TTSResult:
+    """An mp3 written by text_to_speech, described from the handle that wrote it"""
+    path: str
+    filename: str
+    size_bytes: int
+    created_at: float
+
+    def to_audio_kwargs(self) -> dict:
+        """Column values for an output AudioFile row"""
+        return {
+            'filename': self.filename,
+            'file_path': self.path,
+            'file_type': 'output',
+            'file_size': self.size_bytes
+        }
+
 class SpeechService:
     """
     Backend-safe speech service with enhanced error handling and debugging
@@ -27,17 +98,24 @@ class SpeechService:
             # Reasonable defaults
             self.recognizer.energy_threshold = 300
             self.recognizer.dynamic_energy_threshold = True
+            # End microphone capture after 0.6s of silence instead of the full duration
+            self.recognizer.pause_threshold = 0.6
+            self.recognizer.non_speaking_duration = 0.3
             logger.info("SpeechRecognition available and configured")
         else:
             self.recognizer = None
             logger.warning("SpeechRecognition not available. Install with: pip install SpeechRecognition pocketsphinx")
 
     # ---------- STT ----------
-    def speech_to_text(self, file_path: str = None, language: str = "en-US", duration: int = 5) -> str | None:
+    def speech_to_text(self, file_path: str = None, language: str = "en-US", duration: int = 5,
+                       transcribe_early: bool = False) -> str | None:
         """
         Convert an audio file to text, or record from microphone if no file_path.
+        Microphone capture stops at the first pause, capped at `duration` seconds.
         Supports wav/flac/aiff (formats SpeechRecognition can read).
         `language` should be like 'en-US', 'hi-IN', etc.
+        `transcribe_early` (microphone only) starts recognizing the first
+        seconds of speech while the recorder waits for the phrase to end.
         """
         if not _SR_AVAILABLE or not self.recognizer:
             logger.error("SpeechRecognition not installed/initialized")
@@ -52,57 +130,132 @@ class SpeechService:
                 with sr.AudioFile(file_path) as source:
                     audio = self.recognizer.record(source)
                     logger.info(f"Audio loaded successfully from file")
+                audio = self._downsample(audio)
+            elif file_path is None:
+                try:
+                    audio, transcript = self._record_microphone(language, duration, transcribe_early)
+                    if transcript:
+                        return transcript
+                except sr.WaitTimeoutError:
+                    logger.info(f"No speech detected within {duration}s")
+                    return None
             else:
                 logger.error(f"Audio file not found or not provided: {file_path}")
                 return None
 
-            # Handle language parameter
-            if language == 'auto':
-                language = 'en-US'  # Default fallback
+            return self._recognize(audio, language, gate_silence=file_path is None)
+
+        except Exception as e:
+            logger.exception(f"speech_to_text failed: {e}")
+            return None
+
+    def _record_microphone(self, language: str, duration: int, transcribe_early: bool = False,
+                           head_seconds_limit: float = 1.5):
+        """
+        Listen on the default microphone for at most `duration` seconds,
+        stopping as soon as the speaker pauses. With `transcribe_early`, speech
+        running past `head_seconds_limit` is transcribed in a background thread
+        while the recorder waits to see whether the speaker goes on. If the
+        phrase ends there, that transcript is the final one and is returned
+        with the audio, saving a recognition round trip; otherwise it is dropped.
+        Returns (audio, transcript), the transcript being None unless the head was it.
+        """
+        logger.info(f"Listening up to {duration}s from microphone")
+        with sr.Microphone() as source:
+            if not transcribe_early or duration <= head_seconds_limit:
+                return self.recognizer.listen(source, timeout=duration, phrase_time_limit=duration), None
             
-            logger.info(f"Attempting speech recognition with language: {language}")
+            head = self.recognizer.listen(source, timeout=duration, phrase_time_limit=head_seconds_limit)
+            head_seconds = len(head.frame_data) / (head.sample_rate * head.sample_width)
+            if head_seconds < head_seconds_limit:
+                # Phrase ended on a pause before the cut-off
+                return head, None
             
-            # Try Google first (online, free quota)
+            head_text = {}
+            transcriber = threading.Thread(
+                target=lambda: head_text.update(text=self._recognize(head, language, gate_silence=True)),
+                daemon=True
+            )
+            transcriber.start()
             try:
-                text = self.recognizer.recognize_google(audio, language=language)
-                logger.info(f"Google STT successful: {text}")
-                return text
-            except sr.UnknownValueError:
-                logger.warning("Google STT could not understand audio; will try Sphinx if available")
-            except sr.RequestError as e:
-                logger.warning(f"Google STT request error: {e}; will try Sphinx if available")
+                tail = self.recognizer.listen(
+                    source, timeout=self.recognizer.pause_threshold,
+                    phrase_time_limit=duration - head_seconds_limit
+                )
+            except sr.WaitTimeoutError:
+                # Nothing followed the head: its transcript is the final one
+                transcriber.join()
+                return head, head_text.get('text')
+        
+        return sr.AudioData(head.frame_data + tail.frame_data, head.sample_rate, head.sample_width), None
 
-            # Fallback to Sphinx (offline)
-            try:
-                text = self.recognizer.recognize_sphinx(audio)
-                logger.info(f"Sphinx STT successful: {text}")
-                return text
-            except Exception as e:
-                logger.warning(f"Sphinx STT failed: {e}")
+    @staticmethod
+    def _downsample(audio):
+        """
+        Resample captures above STT_SAMPLE_RATE to 16 kHz/16-bit (AudioFile has
+        already mixed to mono). Recognition quality is unchanged and the FLAC
+        sent to Google shrinks accordingly, e.g. ~2.7x for 44.1 kHz uploads.
+        """
+        if audio.sample_rate <= STT_SAMPLE_RATE:
+            return audio
+        raw = audio.get_raw_data(convert_rate=STT_SAMPLE_RATE, convert_width=2)
+        return sr.AudioData(raw, STT_SAMPLE_RATE, 2)
+
+    def _recognize(self, audio, language: str, gate_silence: bool = False) -> str | None:
+        """
+        Run Google STT with a Sphinx fallback on captured audio.
+        `gate_silence` skips recognition of captures below the recognizer's
+        energy threshold; only microphone captures are measured against it,
+        since nothing calibrates the threshold for uploaded files.
+        """
+        # Silent captures cannot be transcribed; skip the network round-trip
+        if gate_silence:
+            level = audio_peak_level(audio)
+            if level < self.recognizer.energy_threshold:
+                logger.info(f"Audio level {level:.0f} below energy threshold; skipping recognition")
                 return None
+        
+        # Handle language parameter
+        if language == 'auto':
+            language = 'en-US'  # Default fallback
+        
+        logger.info(f"Attempting speech recognition with language: {language}")
+        
+        # Try Google first (online, free quota)
+        try:
+            text = self.recognizer.recognize_google(audio, language=language)
+            logger.info(f"Google STT successful: {text}")
+            return text
+        except sr.UnknownValueError:
+            logger.warning("Google STT could not understand audio; will try Sphinx if available")
+        except sr.RequestError as e:
+            logger.warning(f"Google STT request error: {e}; will try Sphinx if available")
 
+        # Fallback to Sphinx (offline)
+        try:
+            text = self.recognizer.recognize_sphinx(audio)
+            logger.info(f"Sphinx STT successful: {text}")
+            return text
         except Exception as e:
-            logger.exception(f"speech_to_text failed: {e}")
+            logger.warning(f"Sphinx STT failed: {e}")
             return None
 
     # ---------- TTS with Enhanced Error Handling ----------
-    def text_to_speech(self, text: str, language: str = "en") -> str | None:
+    def text_to_speech(self, text: str, language: str = "en") -> TTSResult | None:
         """
         Convert text to speech and SAVE an mp3 into the upload folder.
-        Returns the ABSOLUTE file path, or None on failure.
+        Returns a TTSResult for the written file, or None on failure.
         """
         try:
-            logger.info(f"Starting text-to-speech conversion")
-            logger.info(f"Text: {text[:100]}{'...' if len(text) > 100 else ''}")
-            logger.info(f"Language: {language}")
-            logger.info(f"Upload folder: {self.upload_folder}")
+            logger.debug("Starting text-to-speech conversion (%s, %d chars) into %s",
+                         language, len(text) if text else 0, self.upload_folder)
             
             if not text or not text.strip():
                 logger.error("Text is empty or None")
                 return None
             
             if not os.path.exists(self.upload_folder):
-                logger.info(f"Creating upload folder: {self.upload_folder}")
+                logger.debug("Creating upload folder: %s", self.upload_folder)
                 os.makedirs(self.upload_folder, exist_ok=True)
             
             # Validate language code for gTTS
@@ -111,40 +264,34 @@ class SpeechService:
             ]
             
             if language not in valid_gtts_languages:
-                logger.warning(f"Language {language} not supported by gTTS, falling back to English")
+                logger.warning("Language %s not supported by gTTS, falling back to English", language)
                 language = 'en'
             
             # Create gTTS object
-            logger.info(f"Creating gTTS object with language: {language}")
+            logger.debug("Creating gTTS object with language: %s", language)
             tts = gTTS(text=text, lang=language, slow=False)
             
             # Generate filename
             filename = f"tts_{uuid.uuid4().hex}.mp3"
             out_path = os.path.join(self.upload_folder, filename)
             
-            logger.info(f"Saving audio to: {out_path}")
+            logger.debug("Saving audio to: %s", out_path)
             
-            # Save the audio file
-            tts.save(out_path)
+            # Write through one handle; fstat sizes and dates the file without another path lookup
+            with open(out_path, "wb") as f:
+                tts.write_to_fp(f)
+                f.flush()
+                stat = os.fstat(f.fileno())
             
-            # Verify file was created and has content
-            if os.path.exists(out_path):
-                file_size = os.path.getsize(out_path)
-                logger.info(f"Audio file created successfully: {out_path}")
-                logger.info(f"File size: {file_size} bytes")
-                
-                if file_size > 0:
-                    return out_path
-                else:
-                    logger.error("Generated audio file is empty")
-                    return None
-            else:
-                logger.error("Audio file was not created")
-                return None
+            logger.debug("Audio file created: %s (%s bytes)", out_path, stat.st_size)
+            if stat.st_size > 0:
+                return TTSResult(out_path, filename, stat.st_size, stat.st_mtime)
+            logger.error("Generated audio file is empty")
+            return None
                 
         except Exception as e:
-            logger.exception(f"text_to_speech failed: {e}")
-            logger.error(f"Error details - Text length: {len(text) if text else 0}, Language: {language}")
+            logger.exception("text_to_speech failed: %s", e)
+            logger.error("Error details - Text length: %s, Language: %s", len(text) if text else 0, language)
             return None
 
     # ---------- Language Mapping Methods ----------
@@ -162,9 +309,7 @@ class SpeechService:
         Get language code for text-to-speech.
         Maps app language codes to gTTS format.
         """
-        mapped = self.map_tts_language(lang_code)
-        logger.info(f"Mapped language code {lang_code} -> {mapped}")
-        return mapped
+        return self.map_tts_language(lang_code)
 
     # ---------- Helpers ----------
     @staticmethod
@@ -172,48 +317,14 @@ class SpeechService:
         """
         Map app language like 'en','hi','mr' to SpeechRecognition locale e.g. 'en-US','hi-IN'
         """
-        mapping = {
-            'en': 'en-US',
-            'hi': 'hi-IN',
-            'mr': 'mr-IN',
-            'gu': 'gu-IN',
-            'pa': 'pa-IN',
-            'ta': 'ta-IN',
-            'te': 'te-IN',
-            'kn': 'kn-IN',
-            'bn': 'bn-IN',
-            'ur': 'ur-PK',
-            'ml': 'ml-IN',
-            'or': 'or-IN',
-            'as': 'as-IN',
-            'ne': 'ne-NP',
-        }
-        result = mapping.get(lang_code, 'en-US')
-        logger.debug(f"SR Language mapping: {lang_code} -> {result}")
-        return result
+        return _sr_language(lang_code)
 
     @staticmethod
     def map_tts_language(lang_code: str) -> str:
         """
         Map app language like 'en','hi','mr' to gTTS code (simpler).
         """
-        mapping = {
-            'en': 'en',
-            'hi': 'hi',
-            'mr': 'mr',
-            'gu': 'gu',
-            'pa': 'pa',
-            'ta': 'ta',
-            'te': 'te',
-            'kn': 'kn',
-            'bn': 'bn',
-            'ur': 'ur',
-            'ml': 'ml',
-            'ne': 'ne',
-        }
-        result = mapping.get(lang_code, 'en')
-        logger.debug(f"TTS Language mapping: {lang_code} -> {result}")
-        return result
+        return _tts_language(lang_code)
     
     # ---------- Utility Methods ----------
     def validate_audio_file(self, file_path: str) -> bool:
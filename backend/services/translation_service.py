@@ -2,29 +2,74 @@ from deep_translator import GoogleTranslator
 from langdetect import detect
 import logging
 import re
+from functools import lru_cache
+
+# Unicode blocks used by exactly one of the supported languages.
+# Devanagari (hi/mr/ne) and Bengali (bn/as) are shared, so they go to langdetect.
+_SCRIPT_BLOCKS = (
+    (0x0A00, 0x0A7F, 'pa'),  # Gurmukhi
+    (0x0A80, 0x0AFF, 'gu'),  # Gujarati
+    (0x0B00, 0x0B7F, 'or'),  # Odia
+    (0x0B80, 0x0BFF, 'ta'),  # Tamil
+    (0x0C00, 0x0C7F, 'te'),  # Telugu
+    (0x0C80, 0x0CFF, 'kn'),  # Kannada
+    (0x0D00, 0x0D7F, 'ml'),  # Malayalam
+)
+
+def detect_script_language(text):
+    """
+    Cheap language guess from the script alone: 'en' for plain ASCII text,
+    or the language owning an unambiguous Indic script. None when unsure.
+    """
+    if not text or not text.strip():
+        return None
+    if text.isascii():
+        return 'en'
+    for char in text:
+        code = ord(char)
+        if code < 0x0A00 or code > 0x0D7F:
+            continue
+        for start, end, lang in _SCRIPT_BLOCKS:
+            if start <= code <= end:
+                return lang
+    return None
+
+SUPPORTED_LANGUAGES = {
+    'hindi': 'hi',
+    'marathi': 'mr', 
+    'gujarati': 'gu',
+    'punjabi': 'pa',
+    'tamil': 'ta',
+    'telugu': 'te',
+    'kannada': 'kn',
+    'bengali': 'bn',
+    'english': 'en',
+    'urdu': 'ur',
+    'odia': 'or',
+    'assamese': 'as',
+    'malayalam': 'ml',
+    'nepali': 'ne',
+    'sindhi': 'sd'
+}
+
+# Reverse mapping for language code to name
+LANGUAGE_NAMES = {v: k for k, v in SUPPORTED_LANGUAGES.items()}
+
+@lru_cache(maxsize=32)
+def _language_name(lang_code):
+    return LANGUAGE_NAMES.get(lang_code, 'unknown')
+
+@lru_cache(maxsize=2048)
+def _langdetect(text):
+    # Farmers repeat the same short questions; langdetect profiles every call from scratch
+    return detect(text)
 
 class TranslationService:
     def __init__(self):
-        self.supported_languages = {
-            'hindi': 'hi',
-            'marathi': 'mr', 
-            'gujarati': 'gu',
-            'punjabi': 'pa',
-            'tamil': 'ta',
-            'telugu': 'te',
-            'kannada': 'kn',
-            'bengali': 'bn',
-            'english': 'en',
-            'urdu': 'ur',
-            'odia': 'or',
-            'assamese': 'as',
-            'malayalam': 'ml',
-            'nepali': 'ne',
-            'sindhi': 'sd'
-        }
+        self.supported_languages = SUPPORTED_LANGUAGES
         
         # Reverse mapping for language code to name
-        self.language_codes = {v: k for k, v in self.supported_languages.items()}
+        self.language_codes = LANGUAGE_NAMES
     
     def is_english(self, text):
         """Simple check if text is primarily English"""
@@ -45,10 +90,14 @@ class TranslationService:
     def detect_language(self, text):
         """Detect language using langdetect library"""
         try:
+            by_script = detect_script_language(text)
+            if by_script:
+                return by_script
+            
             if self.is_english(text):
                 return 'en'
             
-            detected = detect(text)
+            detected = _langdetect(text)
             logging.info(f"Detected language: {detected}")
             return detected
         except Exception as e:
@@ -57,7 +106,7 @@ class TranslationService:
     
     def get_language_name(self, lang_code):
         """Get language name from language code"""
-        return self.language_codes.get(lang_code, 'unknown')
+        return _language_name(lang_code)
     
     def translate_to_english(self, text, source_language=None):
         """FIXED: Translate text to English with optional source language parameter"""
@@ -85,6 +134,35 @@ class TranslationService:
             logging.error(f"Translation to English failed: {e}")
             return text
     
+    def batch_translate_to_english(self, texts):
+        """
+        Detect and translate several texts with a single translation request.
+        Returns a list of (detected_language, english_text) tuples.
+        """
+        detected = [self.detect_language(text) for text in texts]
+        results = list(texts)
+        
+        # Only non-English, non-empty texts need the network round-trip
+        pending = [i for i, text in enumerate(texts) if detected[i] != 'en' and text and text.strip()]
+        if not pending:
+            return list(zip(detected, results))
+        
+        try:
+            # One request for all texts, one per line
+            joined = '\n'.join(' '.join(texts[i].split()) for i in pending)
+            translated = GoogleTranslator(source='auto', target='en').translate(joined)
+            parts = translated.split('\n') if translated else []
+            if len(parts) != len(pending):
+                raise ValueError(f"expected {len(pending)} lines, got {len(parts)}")
+            for i, part in zip(pending, parts):
+                results[i] = part.strip() or texts[i]
+        except Exception as e:
+            logging.warning(f"Batch translation failed, translating individually: {e}")
+            for i in pending:
+                results[i] = self.translate_to_english(texts[i], detected[i])
+        
+        return list(zip(detected, results))
+    
     def translate_from_english(self, text, target_language_code):
         """Translate from English to target language using language code"""
         try:
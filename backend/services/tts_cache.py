@@ -0,0 +1,73 @@
+import io
+import os
+import time
+import uuid
+import itertools
+import hashlib
+import logging
+from gtts import gTTS
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_DIR = os.path.join("cache", "tts")
+# Files unused this long are deleted, and at most TTS_CACHE_MAX_FILES are kept
+TTS_CACHE_MAX_AGE = 30 * 24 * 3600
+TTS_CACHE_MAX_FILES = 2000
+# The directory is scanned once every this many new files
+PRUNE_EVERY = 100
+
+_writes = itertools.count(1)
+
+def prune(cache_dir: str = TTS_CACHE_DIR, max_age: float = TTS_CACHE_MAX_AGE,
+          max_files: int = TTS_CACHE_MAX_FILES) -> int:
+    """Delete cached mp3s that are too old, then the least recently used beyond max_files"""
+    try:
+        entries = [entry for entry in os.scandir(cache_dir) if entry.name.endswith(".mp3")]
+    except FileNotFoundError:
+        return 0
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    cutoff = time.time() - max_age
+    removed = 0
+    for index, entry in enumerate(entries):
+        if index >= max_files or entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    if removed:
+        logger.info(f"Pruned {removed} cached TTS files")
+    return removed
+
+def synthesize(text: str, lang: str = "en", slow: bool = False, cache_dir: str = TTS_CACHE_DIR) -> bytes:
+    """
+    Return mp3 bytes for `text`, calling gTTS only on a cache miss.
+    Entries are keyed by (lang, slow, text) and written atomically.
+    """
+    key = hashlib.sha1(f"{lang}|{slow}|{text}".encode('utf-8')).hexdigest()
+    path = os.path.join(cache_dir, f"{key}.mp3")
+
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            audio_bytes = f.read()
+        # mtime doubles as last use, so pruning keeps the popular answers
+        os.utime(path)
+        return audio_bytes
+
+    # Render into memory; the caller gets these bytes without a re-read
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang, slow=slow).write_to_fp(buffer)
+    audio_bytes = buffer.getvalue()
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(audio_bytes)
+    os.replace(tmp_path, path)
+    logger.info(f"Cached TTS audio: {path}")
+    if next(_writes) % PRUNE_EVERY == 0:
+        prune(cache_dir)
+
+    return audio_bytes
@@ -0,0 +1,77 @@
+import threading
+import orjson
+from dataclasses import dataclass, asdict, field
+from functools import cached_property
+from datetime import datetime
+from typing import Optional
+from cachetools import TTLCache
+from sqlalchemy import select
+from extensions import db
+from models import User
+
+USER_CACHE_TTL = 300
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Read-only snapshot of a user row for authenticated read paths"""
+    id: int
+    login_id: str
+    email: str
+    name: str
+    phone_number: Optional[str]
+    preferred_language: Optional[str]
+    location: Optional[str]
+    created_at: Optional[datetime]
+    last_login: Optional[datetime]
+    is_active: bool
+    profile_version: Optional[int] = field(default=None, repr=False)
+
+    def to_dict(self):
+        data = asdict(self)
+        del data['profile_version']
+        return data
+
+    @cached_property
+    def json_bytes(self):
+        """to_dict() as JSON, encoded once per snapshot"""
+        return orjson.dumps(self.to_dict())
+
+# Per-worker cache. Each read checks is_active and profile_version against the
+# live row (a two-column primary-key lookup), so changes made through any
+# worker are seen at once; entries otherwise expire after USER_CACHE_TTL.
+# Misses (unknown ids) are not cached.
+_cache = TTLCache(maxsize=4096, ttl=USER_CACHE_TTL)
+_cache_lock = threading.Lock()
+
+def cache_user(user):
+    """Store a snapshot of `user` and return it"""
+    snapshot = CachedUser(**user.to_dict(), profile_version=user.profile_version)
+    with _cache_lock:
+        _cache[user.id] = snapshot
+    return snapshot
+
+def get_cached_user(user_id):
+    """Return the user snapshot for `user_id`, reloading it when the row has changed"""
+    user_id = int(user_id)
+    current = db.session.execute(
+        select(User.is_active, User.profile_version).where(User.id == user_id)
+    ).first()
+    if current is None:
+        invalidate_user(user_id)
+        return None
+
+    with _cache_lock:
+        cached = _cache.get(user_id)
+    if (cached is not None and cached.is_active == current.is_active
+            and cached.profile_version == current.profile_version):
+        return cached
+
+    user = db.session.get(User, user_id)
+    if not user:
+        return None
+    return cache_user(user)
+
+def invalidate_user(user_id):
+    """Forget the cached snapshot after the user row changes"""
+    with _cache_lock:
+        _cache.pop(int(user_id), None)
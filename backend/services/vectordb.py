@@ -1,4 +1,4 @@
-import json
+import orjson
 import logging
 from pathlib import Path
 import chromadb
@@ -126,7 +126,7 @@ class VectorDatabase:
             with tqdm(total=total_lines, desc="Processing JSONL lines", unit="lines") as pbar:
                 for line_num, line in enumerate(file, 1):
                     try:
-                        item = json.loads(line.strip())
+                        item = orjson.loads(line)
                         
                         # Validate required fields
                         if 'input' not in item or 'output' not in item:
@@ -154,7 +154,7 @@ class VectorDatabase:
                         data.append(processed_item)
                         pbar.update(1)
                         
-                    except json.JSONDecodeError as e:
+                    except orjson.JSONDecodeError as e:
                         logging.error(f"Line {line_num}: JSON decode error - {e}")
                         pbar.update(1)
                         continue
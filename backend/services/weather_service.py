@@ -1,14 +1,37 @@
 import requests
 import logging
+import threading
+from cachetools import TTLCache
 from config import Config
+from services.http_session import create_session
 
 class WeatherService:
-    def __init__(self, api_key):
+    def __init__(self, api_key, session=None):
         self.api_key = api_key
         self.base_url = Config.WEATHER_BASE_URL
+        # Reuse keep-alive connections across lookups
+        self.session = session or create_session()
+        # Nearby coordinates (~1 km) share one recent reading
+        self._cache = TTLCache(maxsize=10000, ttl=600)
+        self._cache_lock = threading.Lock()
     
     def get_weather(self, lat, lon):
-        """Get current weather for given coordinates"""
+        """Get current weather for given coordinates (cached for 10 minutes)"""
+        if lat is None or lon is None:
+            return None
+        key = (round(lat, 2), round(lon, 2))
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        
+        weather_info = self._fetch_weather(lat, lon)
+        if weather_info is not None:
+            with self._cache_lock:
+                self._cache[key] = weather_info
+        return weather_info
+    
+    def _fetch_weather(self, lat, lon):
         try:
             params = {
                 'lat': lat,
@@ -17,7 +40,7 @@ class WeatherService:
                 'units': 'metric'
             }
             
-            response = requests.get(self.base_url, params=params)
+            response = self.session.get(self.base_url, params=params)
             response.raise_for_status()
             
             data = response.json()
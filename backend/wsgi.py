@@ -0,0 +1,5 @@
+# WSGI entry point for production servers: gunicorn -c gunicorn.conf.py wsgi:app
+# Kept out of app.py so importing the factory never builds an app.
+from app import create_app
+
+app = create_app()